@@ -1,10 +1,19 @@
-from . import preferences
-from . import overlay_objects
-from . import utils
-from . import props
-from . import panel
-from . import operator
-from . import macro
+try:
+    import bpy
+except ImportError:
+    # Imported outside Blender, e.g. by a texture encoding worker process
+    bpy = None
+
+if bpy is not None:
+    from . import preferences
+    from . import overlay_objects
+    from . import utils
+    from . import props
+    from . import panel
+    from . import operator
+    from . import macro
+    from . import tuning
+    from . import background
 
 bl_info = {
     "name": "EZ Bake",
@@ -24,6 +33,8 @@ def register():
     panel.register()
     operator.register()
     macro.register()
+    tuning.register()
+    background.register()
 
 
 def unregister():
@@ -34,6 +45,8 @@ def unregister():
     panel.unregister()
     operator.unregister()
     macro.unregister()
+    tuning.unregister()
+    background.unregister()
 
 
 if __name__ == "__main__":
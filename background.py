@@ -0,0 +1,243 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+import bpy
+from bpy.app.handlers import persistent
+from . import utils
+from . import image_pool
+
+# Baking in a background Blender process, the open file is left untouched.
+# The current state is saved to a snapshot .blend next to the original (so relative texture paths
+# resolve to the same files) and baked with `blender -b`. The child reports finished images, progress,
+# the objects sharing a bake and the end of its preview pass on stdout, the parent reloads the images
+# as they land and sets up the materials.
+# With several workers every child bakes its share of the objects and UDIM tiles in parallel,
+# with an equal share of the CPU threads.
+
+# Set in the child, holds the path of the file the bake was started from
+PROJECT_ENV = "EZBAKE_PROJECT"
+# Set in the child, "{index}/{count}" of the worker when the bake is split between several
+WORKER_ENV = "EZBAKE_WORKER"
+# Prefix of protocol lines on the child's stdout
+PREFIX = "EZBAKE\t"
+
+CHILD_SCRIPT = "import bpy; " \
+               "bpy.context.scene.ez_bake_scene_props.use_background = False; " \
+               "bpy.ops.object.ez_bake(use_collections={use_collections})"
+
+# Running job: worker processes, their stdout reader threads and the (worker, line) queue,
+# progress reported by every worker, snapshot path and baked object names
+_job = None
+
+
+def is_child():
+    return PROJECT_ENV in os.environ
+
+
+# Path of the .blend the bake belongs to, the original file when running in the child
+def get_project_path():
+    return os.environ.get(PROJECT_ENV) or bpy.data.filepath
+
+
+def is_running():
+    return _job is not None
+
+
+# Jobs this process bakes, every count-th one starting at its worker index
+def get_worker_share(jobs):
+    index, _, count = os.environ.get(WORKER_ENV, "0/1").partition("/")
+    return jobs[int(index)::int(count)]
+
+
+# Protocol line for the parent, nothing outside the child
+def emit(kind, *values):
+    if is_child():
+        print(PREFIX + "\t".join([kind] + [str(v) for v in values]), flush=True)
+
+
+def emit_image(name, image):
+    emit("IMAGE", name, bpy.path.abspath(image.filepath_raw), image.colorspace_settings.name)
+
+
+def emit_progress(progress):
+    emit("PROGRESS", progress.progress, progress.total, progress.estimated_done, progress.estimated_total)
+
+
+def start(context, objects, use_collections=False):
+    global _job
+
+    filepath = bpy.data.filepath
+    directory, filename = os.path.split(filepath)
+    snapshot = os.path.join(directory, f'.{os.path.splitext(filename)[0]}.ezbake_snapshot.blend')
+    bpy.ops.wm.save_as_mainfile(filepath=snapshot, copy=True)
+
+    workers = context.scene.ez_bake_scene_props.background_workers
+    arguments = []
+    if workers > 1:
+        arguments = ["-t", str(max(1, (os.cpu_count() or 1) // workers))]
+
+    lines = queue.Queue()
+    processes = []
+    readers = []
+    for index in range(workers):
+        env = dict(os.environ)
+        env[PROJECT_ENV] = filepath
+        env[WORKER_ENV] = f'{index}/{workers}'
+        process = subprocess.Popen(
+            [bpy.app.binary_path] + arguments +
+            # An exception in the bake exits with 1 instead of 0, so it isn't reported as finished
+            ["-b", snapshot, "--addons", __package__, "--python-exit-code", "1", "--python-expr",
+             CHILD_SCRIPT.format(use_collections=use_collections)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+
+        reader = threading.Thread(target=read_lines, args=(process.stdout, index, lines), daemon=True)
+        reader.start()
+        processes.append(process)
+        readers.append(reader)
+
+    _job = {
+        "processes": processes,
+        "readers": readers,
+        "lines": lines,
+        # (finished steps, estimated seconds done) of every worker
+        "progress": [(0, 0.0)] * workers,
+        "snapshot": snapshot,
+        "objects": [obj.name for obj in objects],
+        # Workers done with their preview pass
+        "previews": 0,
+    }
+    context.scene.ez_bake_progress.start(0, 0.0)
+    bpy.app.timers.register(poll, first_interval=0.2)
+    print(f"[EZBake]: Baking in background processes {', '.join(str(p.pid) for p in processes)}")
+
+
+def read_lines(stream, index, lines):
+    for line in stream:
+        lines.put((index, line))
+
+
+# Stops the children, the results that already landed are still set up on the materials
+def cancel():
+    if _job is not None:
+        try:
+            setup_materials()
+        finally:
+            stop()
+
+
+# Stops the children and forgets the job, also when its timer is already gone
+def stop():
+    if bpy.app.timers.is_registered(poll):
+        bpy.app.timers.unregister(poll)
+    end_job()
+
+
+# Forgets the job, terminating any child still running. The timer ends it by returning None
+def end_job():
+    global _job
+    if _job is None:
+        return
+
+    for process in _job["processes"]:
+        if process.poll() is None:
+            process.terminate()
+    if os.path.exists(_job["snapshot"]):
+        os.remove(_job["snapshot"])
+    _job = None
+
+    # Not available while the add-on is unregistered on quit
+    scene = getattr(bpy.context, "scene", None)
+    if scene is not None:
+        scene.ez_bake_progress.reset()
+        redraw()
+
+
+# Timer callback, a failure stops the job instead of leaving it running without a timer
+def poll():
+    try:
+        return update()
+    except Exception as e:
+        print(f"[EZBake]: Background bake failed: {e}")
+        end_job()
+        return None
+
+
+# Applies everything the children reported so far, None once they're done
+def update():
+    scene = bpy.context.scene
+    progress = scene.ez_bake_progress
+    # Output is read to the end before the job counts as finished
+    finished = not any(reader.is_alive() for reader in _job["readers"])
+
+    while True:
+        try:
+            index, line = _job["lines"].get_nowait()
+        except queue.Empty:
+            break
+
+        if not line.startswith(PREFIX):
+            sys.stdout.write(line)
+            continue
+
+        kind, *values = line.rstrip("\n").split("\t")[1:]
+        if kind == "START":
+            progress.total += int(values[0])
+            progress.estimated_total += float(values[1])
+        elif kind == "PROGRESS":
+            _job["progress"][index] = (int(values[0]), float(values[2]))
+            progress.progress = sum(p[0] for p in _job["progress"])
+            progress.estimated_done = sum(p[1] for p in _job["progress"])
+        elif kind == "IMAGE":
+            image_pool.load_final(values[0], values[1], values[2])
+        elif kind == "BAKED_AS":
+            obj = bpy.data.objects.get(values[0])
+            if obj is not None:
+                obj.ez_bake_object_props.baked_as = values[1]
+        elif kind == "PREVIEW":
+            # Materials are only set up once, wait for the previews of every worker
+            _job["previews"] += 1
+            if _job["previews"] == len(_job["processes"]):
+                setup_materials()
+
+    redraw()
+    if not finished or not _job["lines"].empty():
+        return 0.2
+
+    returncode = max((process.wait() for process in _job["processes"]), key=abs)
+    setup_materials()
+    end_job()
+
+    print(f"[EZBake]: Background bake {'finished' if returncode == 0 else f'stopped ({returncode})'}")
+    return None
+
+
+# Materials of the baked objects, with the shared bakes the children reported
+def setup_materials():
+    objects = [bpy.data.objects.get(name) for name in _job["objects"]]
+    utils.setup_materials(bpy.context, [obj for obj in objects if obj is not None])
+
+
+def redraw():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type in {'VIEW_3D', 'IMAGE_EDITOR'}:
+                area.tag_redraw()
+
+
+# Objects of the job are gone with the file it was started from
+@persistent
+def stop_on_load(_):
+    stop()
+
+
+def register():
+    bpy.app.handlers.load_pre.append(stop_on_load)
+
+
+def unregister():
+    stop()
+    if stop_on_load in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(stop_on_load)
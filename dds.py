@@ -0,0 +1,262 @@
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from . import lod
+
+# Pure NumPy block compression (BC1/BC3/BC4/BC5/BC7) and DDS writing.
+# Kept free of bpy so blocks can be encoded in worker processes.
+
+# Format: (DXGI format, DXGI sRGB format, bytes per 4x4 block)
+FORMATS = {
+    "BC1": (71, 72, 8),
+    "BC3": (77, 78, 16),
+    "BC4": (80, 80, 8),
+    "BC5": (83, 83, 16),
+    "BC7": (98, 99, 16),
+}
+
+# Blocks encoded per worker task
+BLOCKS_PER_TASK = 1 << 14
+
+# BC7 interpolation weights for 4 bit indices
+BC7_WEIGHTS = np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype=np.float32)
+
+_pool = None
+
+
+# Block compression used for each map
+# color_format is 'BC7' or 'BC1' (BC1, or BC3 when the map has alpha)
+def get_format(map_name, color_format='BC7', has_alpha=False):
+    if map_name == "Normal":
+        return "BC5"
+    if map_name in ("Roughness", "Metallic", "AO", "Alpha"):
+        return "BC4"
+    if map_name == "Emission":
+        return "BC1"
+    if color_format == 'BC7':
+        return "BC7"
+    return "BC3" if has_alpha else "BC1"
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # Forking Blender is unsafe, always spawn fresh interpreters
+        _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+# Write (height, width, 4) float pixels (bottom row first, as in Blender) with a full mip chain
+def save_dds(filepath, pixels, format, srgb=False, kind="LINEAR", pool=None):
+    levels = [pixels] + list(lod.mip_chain(pixels, kind))
+    data = [encode_level(level, format, pool) for level in levels]
+
+    dxgi_format = FORMATS[format][1 if srgb else 0]
+    height, width = pixels.shape[:2]
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "wb") as file:
+        file.write(get_header(width, height, len(levels), dxgi_format, len(data[0])))
+        for level_data in data:
+            file.write(level_data)
+
+
+def get_header(width, height, mip_count, dxgi_format, top_level_size):
+    # DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_MIPMAPCOUNT | DDSD_LINEARSIZE
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x80000
+    # DDSCAPS_COMPLEX | DDSCAPS_TEXTURE | DDSCAPS_MIPMAP
+    caps = 0x8 | 0x1000 | 0x400000
+    # DDPF_FOURCC, actual format is in the DX10 header
+    pixel_format = struct.pack("<II4s5I", 32, 0x4, b"DX10", 0, 0, 0, 0, 0)
+
+    header = struct.pack("<7I", 124, flags, height, width, top_level_size, 0, mip_count)
+    header += struct.pack("<11I", *([0] * 11))
+    header += pixel_format
+    header += struct.pack("<5I", caps, 0, 0, 0, 0)
+    # DXGI format, 2D texture, no misc flags, array size 1, unknown alpha mode
+    dx10_header = struct.pack("<5I", dxgi_format, 3, 0, 1, 0)
+
+    return b"DDS " + header + dx10_header
+
+
+def encode_level(pixels, format, pool=None):
+    blocks = to_blocks(pixels)
+    chunks = [blocks[i:i + BLOCKS_PER_TASK] for i in range(0, len(blocks), BLOCKS_PER_TASK)]
+
+    if pool is None or len(chunks) == 1:
+        return b"".join(encode_blocks(format, chunk) for chunk in chunks)
+    return b"".join(pool.map(encode_blocks, [format] * len(chunks), chunks))
+
+
+# Split float pixels into (N, 16, 4) uint8 blocks, top row first as DDS expects
+def to_blocks(pixels):
+    pixels = np.clip(np.rint(pixels[::-1] * 255.0), 0, 255).astype(np.uint8)
+
+    # Mip levels smaller than a block are padded by repeating the edge
+    pad_y, pad_x = -pixels.shape[0] % 4, -pixels.shape[1] % 4
+    if pad_y or pad_x:
+        pixels = np.pad(pixels, ((0, pad_y), (0, pad_x), (0, 0)), mode="edge")
+
+    blocks_y, blocks_x = pixels.shape[0] // 4, pixels.shape[1] // 4
+    return pixels.reshape(blocks_y, 4, blocks_x, 4, 4).transpose(0, 2, 1, 3, 4).reshape(-1, 16, 4)
+
+
+def encode_blocks(format, blocks):
+    if format == "BC1":
+        encoded = encode_bc1(blocks[:, :, :3])[:, None]
+    elif format == "BC3":
+        encoded = np.stack([encode_bc4(blocks[:, :, 3]), encode_bc1(blocks[:, :, :3])], axis=1)
+    elif format == "BC4":
+        encoded = encode_bc4(blocks[:, :, 0])[:, None]
+    elif format == "BC5":
+        encoded = np.stack([encode_bc4(blocks[:, :, 0]), encode_bc4(blocks[:, :, 1])], axis=1)
+    elif format == "BC7":
+        encoded = encode_bc7(blocks)
+    else:
+        raise Exception(f"Unknown block compression format {format}")
+
+    return encoded.astype("<u8").tobytes()
+
+
+# Endpoints spanning the values of every block along its principal axis
+def get_principal_endpoints(values, iterations=4):
+    mean = values.mean(axis=1, keepdims=True)
+    centered = values - mean
+    covariance = np.einsum("nki,nkj->nij", centered, centered)
+
+    axis = values.max(axis=1) - values.min(axis=1)
+    for _ in range(iterations):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-8)
+
+    projection = np.einsum("nkc,nc->nk", centered, axis)
+    low = mean[:, 0] + axis * projection.min(axis=1)[:, None]
+    high = mean[:, 0] + axis * projection.max(axis=1)[:, None]
+    return np.clip(low, 0, 255), np.clip(high, 0, 255)
+
+
+def pack_indices(indices, bits):
+    shifts = np.arange(indices.shape[1], dtype=np.uint64) * np.uint64(bits)
+    return (indices.astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64)
+
+
+# Single channel (N, 16) uint8 -> (N,) 8 byte blocks
+def encode_bc4(values):
+    values = values.astype(np.int64)
+    high = values.max(axis=1)
+    low = values.min(axis=1)
+
+    # 8 value mode (high > low): high, low and 6 interpolated steps in between
+    span = np.maximum(high - low, 1)
+    steps = np.rint((high[:, None] - values) * 7 / span[:, None]).astype(np.int64)
+    indices = np.where(steps == 0, 0, np.where(steps == 7, 1, steps + 1))
+    indices[high == low] = 0
+
+    return high.astype(np.uint64) | (low.astype(np.uint64) << np.uint64(8)) | \
+        (pack_indices(indices, 3) << np.uint64(16))
+
+
+def to_565(colors):
+    colors = np.rint(colors * [31 / 255, 63 / 255, 31 / 255]).astype(np.int64)
+    return (colors[:, 0] << 11) | (colors[:, 1] << 5) | colors[:, 2]
+
+
+def from_565(colors):
+    r, g, b = (colors >> 11) & 31, (colors >> 5) & 63, colors & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1).astype(np.float32)
+
+
+# RGB (N, 16, 3) uint8 -> (N,) 8 byte blocks in 4 color mode
+def encode_bc1(rgb):
+    colors = rgb.astype(np.float32)
+    low, high = get_principal_endpoints(colors)
+
+    # 4 color mode requires color0 > color1
+    color0, color1 = to_565(high), to_565(low)
+    swap = color0 < color1
+    color0, color1 = np.where(swap, color1, color0), np.where(swap, color0, color1)
+
+    end0, end1 = from_565(color0), from_565(color1)
+    palette = np.stack([end0, end1, (2 * end0 + end1) / 3, (end0 + 2 * end1) / 3], axis=1)
+    distance = ((colors[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1)
+    indices = distance.argmin(axis=-1)
+    indices[color0 == color1] = 0
+
+    return color0.astype(np.uint64) | (color1.astype(np.uint64) << np.uint64(16)) | \
+        (pack_indices(indices, 2) << np.uint64(32))
+
+
+# Quantize endpoints to 7 bits plus a shared p-bit, picking the p-bit with the lowest error
+def quantize_bc7_endpoint(values):
+    best = None
+    for pbit in (0, 1):
+        quantized = np.clip(np.rint((values - pbit) / 2), 0, 127).astype(np.int64)
+        error = (((quantized << 1) | pbit) - values) ** 2
+        error = error.sum(axis=1)
+        if best is None:
+            best = [quantized, np.zeros(len(values), dtype=np.int64), error]
+        else:
+            better = error < best[2]
+            best[0] = np.where(better[:, None], quantized, best[0])
+            best[1] = np.where(better, 1, best[1])
+            best[2] = np.minimum(error, best[2])
+    return best[0], best[1]
+
+
+def put_bits(low_word, high_word, values, position, count):
+    values = values.astype(np.uint64)
+    if position + count <= 64:
+        low_word |= values << np.uint64(position)
+    elif position >= 64:
+        high_word |= values << np.uint64(position - 64)
+    else:
+        low_word |= values << np.uint64(position)
+        high_word |= values >> np.uint64(64 - position)
+    return position + count
+
+
+# RGBA (N, 16, 4) uint8 -> (N, 2) 16 byte blocks, mode 6 (one subset, 7.7.7.7 endpoints + p-bits)
+def encode_bc7(rgba):
+    values = rgba.astype(np.float32)
+    low, high = get_principal_endpoints(values)
+    endpoint0, pbit0 = quantize_bc7_endpoint(low)
+    endpoint1, pbit1 = quantize_bc7_endpoint(high)
+
+    start = ((endpoint0 << 1) | pbit0[:, None]).astype(np.float32)
+    end = ((endpoint1 << 1) | pbit1[:, None]).astype(np.float32)
+    direction = end - start
+    length = (direction ** 2).sum(axis=1)
+    t = ((values - start[:, None]) * direction[:, None]).sum(axis=-1) / np.maximum(length, 1e-8)[:, None]
+    indices = np.abs(t[:, :, None] * 64 - BC7_WEIGHTS).argmin(axis=-1)
+    indices[length == 0] = 0
+
+    # The first index is stored with 3 bits, so its top bit has to be 0
+    flip = indices[:, 0] >= 8
+    endpoint0, endpoint1 = np.where(flip[:, None], endpoint1, endpoint0), np.where(flip[:, None], endpoint0, endpoint1)
+    pbit0, pbit1 = np.where(flip, pbit1, pbit0), np.where(flip, pbit0, pbit1)
+    indices = np.where(flip[:, None], 15 - indices, indices)
+
+    low_word = np.zeros(len(rgba), dtype=np.uint64)
+    high_word = np.zeros(len(rgba), dtype=np.uint64)
+
+    position = put_bits(low_word, high_word, np.full(len(rgba), 1 << 6), 0, 7)
+    for channel in range(4):
+        position = put_bits(low_word, high_word, endpoint0[:, channel], position, 7)
+        position = put_bits(low_word, high_word, endpoint1[:, channel], position, 7)
+    position = put_bits(low_word, high_word, pbit0, position, 1)
+    position = put_bits(low_word, high_word, pbit1, position, 1)
+    position = put_bits(low_word, high_word, indices[:, 0], position, 3)
+    for texel in range(1, 16):
+        position = put_bits(low_word, high_word, indices[:, texel], position, 4)
+
+    return np.stack([low_word, high_word], axis=1)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+import bpy
+import numpy as np
+
+# Maps whose result depends on sampling and benefits from denoising
+DENOISE_MAPS = {"Color", "Emission"}
+
+
+# Denoise an sRGB image in place with OpenImageDenoise through the compositor
+# Only texels inside mask (height, width) are replaced, keeping the margin untouched
+def denoise_image(image, mask=None):
+    width, height = image.size
+    if width == 0 or height == 0:
+        return
+
+    original = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(original)
+
+    filepath = os.path.join(tempfile.gettempdir(),
+                            f'{bpy.path.clean_name(image.name)}_ezbake_denoised.png')
+    scene = bpy.data.scenes.new("EZBake_denoise_temp")
+    try:
+        setup_denoise_scene(scene, image, filepath)
+
+        # No render layers node, so this only runs the compositor (works headless too)
+        bpy.ops.render.render(write_still=True, scene=scene.name)
+
+        # An 8 bit PNG loads into a byte buffer, read back in the file's sRGB encoding with straight alpha
+        # like the bake target (16 bit files load as linear, premultiplied floats)
+        result_image = bpy.data.images.load(filepath)
+        denoised = np.empty_like(original)
+        result_image.pixels.foreach_get(denoised)
+        bpy.data.images.remove(result_image)
+    finally:
+        bpy.data.scenes.remove(scene)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+    if mask is not None:
+        denoised = np.where(mask.reshape(-1, 1), denoised.reshape(-1, 4),
+                            original.reshape(-1, 4)).ravel()
+
+    image.pixels.foreach_set(denoised)
+    image.update()
+
+
+def setup_denoise_scene(scene, image, filepath):
+    width, height = image.size
+
+    render = scene.render
+    render.resolution_x = width
+    render.resolution_y = height
+    render.resolution_percentage = 100
+    render.dither_intensity = 0.0
+    render.filepath = filepath
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+    render.image_settings.color_depth = '8'
+    if hasattr(render, "compositor_device"):
+        render.compositor_device = 'CPU'
+
+    # Write back the same sRGB encoding the baked image uses
+    scene.display_settings.display_device = 'sRGB'
+    scene.view_settings.view_transform = 'Standard'
+    scene.view_settings.look = 'None'
+    scene.view_settings.exposure = 0.0
+    scene.view_settings.gamma = 1.0
+
+    scene.use_nodes = True
+    node_tree = scene.node_tree
+    nodes = node_tree.nodes
+    links = node_tree.links
+    nodes.clear()
+
+    image_node = nodes.new("CompositorNodeImage")
+    image_node.image = image
+
+    denoise_node = nodes.new("CompositorNodeDenoise")
+    denoise_node.use_hdr = False
+
+    composite_node = nodes.new("CompositorNodeComposite")
+
+    links.new(image_node.outputs["Image"], denoise_node.inputs["Image"])
+    links.new(denoise_node.outputs["Image"], composite_node.inputs["Image"])
@@ -0,0 +1,162 @@
+import json
+import os
+import time
+
+import bpy
+import numpy as np
+from . import utils
+from . import journal
+
+# Bake time model learned from the timings of previous runs on this machine
+# Every map type (and its overlay variant) gets its own linear model:
+#   seconds = a * resolution^2 * samples + b * triangles + c
+
+# Used until enough timings are recorded for a map type
+DEFAULT_COEFFICIENTS = (2e-8, 1e-6, 0.5)
+# Only the most recent timings of each map type are used for fitting
+MAX_SAMPLES = 200
+
+_samples = None
+_coefficients = {}
+_step_start = None
+# (key, seconds) of the last estimate shown in the panel
+_panel_estimate = None
+
+
+# Only created once there are timings to write
+def get_history_path(create=False):
+    directory = bpy.utils.user_resource('CONFIG', path="ez_bake", create=create)
+    return os.path.join(directory, "timings.jsonl")
+
+
+def get_samples():
+    global _samples
+    if _samples is None:
+        _samples = {}
+        path = get_history_path()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        sample = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    _samples.setdefault(sample["map"], []).append(sample)
+    return _samples
+
+
+def get_cost_key(map_name, is_overlay=False):
+    return f'{map_name}_overlay' if is_overlay else map_name
+
+
+# Polygons with n corners make n - 2 triangles
+def get_triangle_count(obj):
+    if obj is None or obj.type != 'MESH':
+        return 0
+    return len(obj.data.loops) - 2 * len(obj.data.polygons)
+
+
+def get_overlay_triangle_count(obj, layer_index):
+    layer = obj.ez_bake_object_props.overlay_layers[layer_index]
+    return sum(get_triangle_count(o.object) for o in layer.objects)
+
+
+def get_features(resolution, samples, triangles):
+    return np.array([resolution * resolution * samples, triangles, 1.0])
+
+
+def fit(samples):
+    default = np.array(DEFAULT_COEFFICIENTS)
+    if not samples:
+        return default
+
+    features = np.array([get_features(s["resolution"], s["samples"], s["triangles"]) for s in samples])
+    seconds = np.array([s["seconds"] for s in samples])
+
+    # Not enough data for a full fit, only scale the default model
+    if len(samples) < 6:
+        return default * np.mean(seconds / np.maximum(features @ default, 1e-6))
+
+    coefficients = np.linalg.lstsq(features, seconds, rcond=None)[0]
+    return np.maximum(coefficients, 0.0)
+
+
+def estimate(map_name, resolution, samples, triangles, is_overlay=False):
+    key = get_cost_key(map_name, is_overlay)
+    if key not in _coefficients:
+        _coefficients[key] = fit(get_samples().get(key, [])[-MAX_SAMPLES:])
+    return float(get_features(resolution, samples, triangles) @ _coefficients[key])
+
+
+def estimate_object(obj, maps):
+    obj_props = obj.ez_bake_object_props
+    triangles = get_triangle_count(obj)
+
+    total = 0.0
+    for map_name in maps:
+        total += estimate(map_name, utils.get_bake_resolution(obj, map_name), utils.get_samples(obj, map_name=map_name),
+                          triangles)
+
+    if obj_props.use_overlays:
+        for layer_index in range(len(obj_props.overlay_layers)):
+            overlay_triangles = triangles + get_overlay_triangle_count(obj, layer_index)
+            for map_name in set(maps) | {"Alpha"}:
+                total += estimate(map_name, utils.get_bake_resolution(obj, map_name),
+                                  utils.get_samples(obj, map_name=map_name), overlay_triangles, is_overlay=True)
+
+    return total
+
+
+def get_enabled_maps(obj):
+    obj_props = obj.ez_bake_object_props
+    return [m[0] for m in utils.MAPS if getattr(obj_props, f'bake_{m[0].lower()}')]
+
+
+def estimate_objects(objects):
+    return sum(estimate_object(obj, get_enabled_maps(obj)) for obj in objects)
+
+
+# Estimate shown in the panel, only recomputed when the objects, their settings or the model change
+def get_panel_estimate(objects, scene):
+    global _panel_estimate
+    key = tuple((obj.name, journal.get_settings_signature(obj, scene), tuple(get_enabled_maps(obj)),
+                 get_triangle_count(obj), get_overlay_triangle_counts(obj)) for obj in objects)
+    if _panel_estimate is None or _panel_estimate[0] != key:
+        _panel_estimate = (key, estimate_objects(objects))
+    return _panel_estimate[1]
+
+
+def get_overlay_triangle_counts(obj):
+    obj_props = obj.ez_bake_object_props
+    if not obj_props.use_overlays:
+        return ()
+    return tuple(get_overlay_triangle_count(obj, i) for i in range(len(obj_props.overlay_layers)))
+
+
+def start_step():
+    global _step_start
+    _step_start = time.perf_counter()
+
+
+# Record how long the step started by start_step took
+# triangles has to be counted like the estimate does, see add_bake
+def finish_step(map_name, resolution, samples, triangles, is_overlay=False):
+    global _step_start, _panel_estimate
+    if _step_start is None:
+        return
+    sample = {
+        "map": get_cost_key(map_name, is_overlay),
+        "resolution": resolution,
+        "samples": samples,
+        "triangles": triangles,
+        "seconds": time.perf_counter() - _step_start,
+    }
+    _step_start = None
+
+    get_samples().setdefault(sample["map"], []).append(sample)
+    _coefficients.pop(sample["map"], None)
+    _panel_estimate = None
+
+    with open(get_history_path(create=True), "a") as file:
+        file.write(json.dumps(sample) + "\n")
+
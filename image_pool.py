@@ -0,0 +1,112 @@
+import os
+
+import bpy
+from . import report
+
+# Pool of reusable bake target images, keyed by (resolution, alpha, colorspace)
+# A target is checked out under the name of the image it stands in for. Once the object
+# is done, saved targets are published to a regular file backed image of that name and
+# returned to the pool, so only a few full resolution buffers are alive at any time.
+
+POOL_KEY = "ez_bake_pool_key"
+TARGET_NAME = "ez_bake_target"
+
+
+def get_pool_images():
+    return [image for image in bpy.data.images if POOL_KEY in image]
+
+
+def get_key(resolution, alpha, colorspace):
+    return f'{resolution}_{int(alpha)}_{colorspace}'
+
+
+# Cleared image to bake the given image name into
+def acquire(name, resolution, alpha, colorspace, color):
+    release(get_checked_out(name))
+
+    key = get_key(resolution, alpha, colorspace)
+    pool = get_pool_images()
+    image = next((i for i in pool if i[POOL_KEY] == key and not i[TARGET_NAME]), None)
+    report.count_cache("image_pool", image is not None)
+
+    if image is None:
+        image = bpy.data.images.new(f'EZBake_pool_{len(pool)}', width=resolution, height=resolution, alpha=alpha)
+        image[POOL_KEY] = key
+    else:
+        print(f"[EZBake]: Reusing {image.name} for {name}")
+
+    image[TARGET_NAME] = name
+    image.colorspace_settings.name = colorspace
+
+    # Regenerate the buffer filled with the clear color
+    image.source = 'GENERATED'
+    image.generated_type = 'BLANK'
+    image.generated_width = resolution
+    image.generated_height = resolution
+    image.generated_color = color
+    image.filepath_raw = ""
+    image.buffers_free()
+
+    return image
+
+
+def get_checked_out(name):
+    return next((i for i in get_pool_images() if i[TARGET_NAME] == name), None)
+
+
+# Image currently holding the given name, pooled or not
+def get(name):
+    image = get_checked_out(name)
+    if image is None:
+        image = bpy.data.images.get(name)
+    return image
+
+
+def get_target_name(image):
+    return image.get(TARGET_NAME) or image.name
+
+
+def release(image):
+    if image is None or POOL_KEY not in image:
+        return
+    image[TARGET_NAME] = ""
+    image.buffers_free()
+
+
+# Point the regular image at the saved file and return the target to the pool
+def publish(image):
+    name = image[TARGET_NAME]
+    filepath = image.filepath_raw
+
+    if filepath and os.path.exists(bpy.path.abspath(filepath)):
+        load_final(name, filepath, image.colorspace_settings.name)
+
+    release(image)
+
+
+# Regular image of the given name backed by the file, reloaded in place when it already exists
+def load_final(name, filepath, colorspace):
+    final_image = bpy.data.images.get(name)
+    if final_image is None:
+        final_image = bpy.data.images.load(bpy.path.abspath(filepath))
+        final_image.name = name
+
+    final_image.colorspace_settings.name = colorspace
+    final_image.source = 'FILE'
+    final_image.filepath = filepath
+    final_image.reload()
+    return final_image
+
+
+def release_all():
+    for image in get_pool_images():
+        if image[TARGET_NAME]:
+            publish(image)
+
+
+# Free the pixels of an image already written to disk, they are read back when needed
+def free_saved(image):
+    if image is None or not os.path.exists(bpy.path.abspath(image.filepath_raw)):
+        return
+    image.source = 'FILE'
+    image.buffers_free()
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+
+import bpy
+from . import background
+from . import utils
+
+# Journal of completed (object, map) bake tasks, stored next to the .blend
+# One JSON object per line, appended as tasks finish so it survives crashes
+
+# Node properties which don't affect the baked result
+NODE_IGNORED_PROPERTIES = {"location", "location_absolute", "width", "height", "dimensions", "width_hidden",
+                           "select", "hide", "show_options", "show_preview", "show_texture", "use_custom_color",
+                           "color", "label", "name", "type", "warning_propagation", "bl_idname", "bl_label",
+                           "bl_description", "bl_icon", "bl_static_type", "bl_width_default", "bl_width_min",
+                           "bl_width_max", "bl_height_default", "bl_height_min", "bl_height_max"}
+
+
+def get_journal_path():
+    filepath = background.get_project_path()
+    if not filepath:
+        return None
+    return os.path.splitext(filepath)[0] + ".ezbake_journal"
+
+
+# Settings that change the baked result, tasks baked with other settings are not reused
+# AO settings only count for the AO map and the ORM image it is packed into, map_name None covers all maps
+def get_settings_signature(obj, scene, map_name=None):
+    obj_props = obj.ez_bake_object_props
+    scene_props = scene.ez_bake_scene_props
+    return json.dumps({
+        "resolution": utils.get_resolution(obj),
+        "samples": obj_props.samples,
+        "uv_map": obj_props.uv_map,
+        "udim": obj_props.use_udim,
+        "denoise": obj_props.use_denoise,
+        "ao": [obj_props.ao_scale, obj_props.ao_samples]
+        if obj_props.bake_ao and map_name in (None, "AO", "ORM") else None,
+        "overlays": obj_props.use_overlays and len(obj_props.overlay_layers),
+        "file_format": scene_props.file_format,
+        "pack_orm": scene_props.pack_orm,
+        "pack_alpha": scene_props.pack_alpha,
+    }, sort_keys=True)
+
+
+def file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Latest entry for every (object, map) pair
+def load():
+    entries = {}
+    journal_path = get_journal_path()
+    if journal_path is None or not os.path.exists(journal_path):
+        return entries
+
+    with open(journal_path, "r") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line may be cut short by a crash
+                continue
+            entries[(entry["object"], entry["map"])] = entry
+    return entries
+
+
+def reset():
+    journal_path = get_journal_path()
+    if journal_path is not None and os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+def record(obj_name, map_name, image, settings, materials=None):
+    journal_path = get_journal_path()
+    if journal_path is None:
+        return
+
+    filepath = bpy.path.abspath(image.filepath_raw)
+    if not os.path.exists(filepath):
+        return
+
+    entry = {
+        "object": obj_name,
+        "map": map_name,
+        "path": filepath,
+        "hash": file_hash(filepath),
+        "settings": settings,
+        "materials": materials or {},
+    }
+    with open(journal_path, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+# Check a finished task still matches what is on disk
+def verify(entries, obj_name, map_name, settings):
+    entry = entries.get((obj_name, map_name))
+    if entry is None or entry["settings"] != settings:
+        return None
+    if not os.path.exists(entry["path"]) or file_hash(entry["path"]) != entry["hash"]:
+        return None
+    return entry
+
+
+# Hash of everything in a material's node tree that can change the baked result
+def get_material_hash(material):
+    digest = hashlib.sha256()
+    if material.node_tree is not None:
+        hash_node_tree(material.node_tree, digest, set())
+    return digest.hexdigest()
+
+
+def hash_node_tree(node_tree, digest, seen):
+    if node_tree.name_full in seen:
+        return
+    seen.add(node_tree.name_full)
+
+    for node in sorted(node_tree.nodes, key=lambda n: n.name):
+        digest.update(f'{node.name}:{node.bl_idname}'.encode())
+        for prop in node.bl_rna.properties:
+            if prop.identifier in NODE_IGNORED_PROPERTIES or prop.type in {'POINTER', 'COLLECTION'}:
+                continue
+            digest.update(f'{prop.identifier}={get_value(getattr(node, prop.identifier))}'.encode())
+        for socket in node.inputs:
+            if hasattr(socket, "default_value"):
+                digest.update(f'{socket.identifier}={get_value(socket.default_value)}'.encode())
+        hash_node_data(node, digest)
+
+        # Referenced data: images by their file, node groups by their contents
+        image = getattr(node, "image", None)
+        if image is not None:
+            digest.update(f'{image.name_full}:{image.filepath}'.encode())
+        group = getattr(node, "node_tree", None)
+        if group is not None:
+            hash_node_tree(group, digest, seen)
+
+    # Link order follows editing history, not the graph
+    links = sorted(f'{link.from_node.name}.{link.from_socket.identifier}>'
+                   f'{link.to_node.name}.{link.to_socket.identifier}' for link in node_tree.links)
+    for link in links:
+        digest.update(link.encode())
+
+
+# Data behind the pointer properties skipped above which changes the node's output:
+# color ramp stops (ColorRamp) and curve points (RGB, Vector and Float Curves)
+def hash_node_data(node, digest):
+    ramp = getattr(node, "color_ramp", None)
+    if ramp is not None:
+        digest.update(f'ramp={ramp.color_mode},{ramp.interpolation},{ramp.hue_interpolation}'.encode())
+        for element in ramp.elements:
+            digest.update(f'{get_value(element.position)}:{get_value(element.color)}'.encode())
+
+    mapping = getattr(node, "mapping", None)
+    if mapping is not None and hasattr(mapping, "curves"):
+        digest.update(f'mapping={mapping.extend},{mapping.use_clip},{get_value(mapping.black_level)},'
+                      f'{get_value(mapping.white_level)},{get_value(mapping.clip_min_x)},'
+                      f'{get_value(mapping.clip_min_y)},{get_value(mapping.clip_max_x)},'
+                      f'{get_value(mapping.clip_max_y)}'.encode())
+        for index, curve in enumerate(mapping.curves):
+            for point in curve.points:
+                digest.update(f'{index}:{get_value(point.location)}:{point.handle_type}'.encode())
+
+
+# Sets (ENUM_FLAG values) are sorted, their iteration order isn't stable
+def get_value(value):
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    if hasattr(value, "__len__") and not isinstance(value, str):
+        return tuple(round(v, 6) if isinstance(v, float) else v for v in value)
+    return round(value, 6) if isinstance(value, float) else value
+
+
+# {material name: hash} of the object's own material slots
+def get_material_hashes(obj):
+    materials = {slot.material for slot in obj.material_slots if slot.material is not None}
+    return {material.name: get_material_hash(material) for material in materials}
+
+
+# Materials edited (or added) since the entry was baked, None when the entry predates material hashes
+def get_changed_materials(entry, hashes):
+    recorded = entry.get("materials")
+    if not recorded:
+        return None
+    return {name for name, material_hash in hashes.items() if recorded.get(name) != material_hash}
+
+
+# Make the image of a skipped task available as if it was just baked
+def restore_image(obj_name, map_name, entry, non_color=False):
+    image_name = f'{obj_name}_{map_name}'
+    image = bpy.data.images.get(image_name)
+
+    if image is None:
+        image = bpy.data.images.load(entry["path"])
+        image.name = image_name
+    elif bpy.path.abspath(image.filepath_raw) != entry["path"] or image.source != 'FILE':
+        image.filepath = entry["path"]
+        image.source = 'FILE'
+        image.reload()
+
+    if non_color:
+        image.colorspace_settings.name = 'Non-Color'
+
+    return image
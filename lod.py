@@ -0,0 +1,65 @@
+import numpy as np
+
+# Pure NumPy downsampling of baked maps, used for LOD texture sets and mip chains.
+# Kept free of bpy so it can be used from worker processes.
+
+# How each map has to be filtered, anything else is plain linear data
+FILTER_KINDS = {
+    "Color": "SRGB",
+    "Emission": "SRGB",
+    "Normal": "NORMAL",
+}
+
+
+def get_filter_kind(map_name):
+    return FILTER_KINDS.get(map_name, "LINEAR")
+
+
+def srgb_to_linear(values):
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(values):
+    values = np.clip(values, 0.0, 1.0)
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * values ** (1.0 / 2.4) - 0.055)
+
+
+# Halve (height, width, 4) float pixels with a 2x2 box filter
+# SRGB: averaged in linear space and weighted by alpha so transparent texels don't darken edges
+# NORMAL: tangent space vectors are averaged and renormalized
+# LINEAR: every channel averaged independently (roughness, metallic, alpha, packed ORM)
+def downsample(pixels, kind="LINEAR"):
+    # Sides already down to a single texel are left alone
+    factor_y = 2 if pixels.shape[0] > 1 else 1
+    factor_x = 2 if pixels.shape[1] > 1 else 1
+    height, width = pixels.shape[0] // factor_y, pixels.shape[1] // factor_x
+    blocks = pixels[:height * factor_y, :width * factor_x].reshape(height, factor_y, width, factor_x, 4)
+    blocks = blocks.astype(np.float32, copy=False)
+
+    if kind == "SRGB":
+        rgb = srgb_to_linear(blocks[..., :3])
+        alpha = blocks[..., 3:]
+        alpha_sum = alpha.sum(axis=(1, 3))
+        weighted = (rgb * alpha).sum(axis=(1, 3))
+        plain = rgb.mean(axis=(1, 3))
+        rgb = np.where(alpha_sum > 0, weighted / np.maximum(alpha_sum, 1e-8), plain)
+        result = np.concatenate([linear_to_srgb(rgb), alpha.mean(axis=(1, 3))], axis=-1)
+    elif kind == "NORMAL":
+        vectors = blocks[..., :3] * 2.0 - 1.0
+        vectors = vectors.sum(axis=(1, 3))
+        length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        vectors = np.where(length > 1e-8, vectors / np.maximum(length, 1e-8), (0.0, 0.0, 1.0))
+        result = np.concatenate([vectors * 0.5 + 0.5, blocks[..., 3:].mean(axis=(1, 3))], axis=-1)
+    else:
+        result = blocks.mean(axis=(1, 3))
+
+    return result.astype(np.float32)
+
+
+# Every level below the given pixels, down to min_size
+def mip_chain(pixels, kind="LINEAR", levels=None, min_size=1):
+    level = 0
+    while (levels is None or level < levels) and min(pixels.shape[:2]) > min_size:
+        pixels = downsample(pixels, kind)
+        level += 1
+        yield pixels
@@ -1,9 +1,46 @@
+import os
+import time
+
 import bpy
+import numpy as np
 from . import utils
+from . import denoise
+from . import journal
+from . import estimator
+from . import lod
+from . import dds
+from . import image_pool
+from . import scratch
+from . import precision
+from . import tuning
+from . import background
+from . import profiling
+from . import report
+
+# Cancelling a run from the UI: the bake already running finishes and its post step puts the
+# materials back, every step after that stops. in_bake is set from the setup step to its post step
+_cancel = {"requested": False, "in_bake": False}
+
+
+def reset_cancel():
+    _cancel["requested"] = False
+    _cancel["in_bake"] = False
+
+
+def request_cancel():
+    _cancel["requested"] = True
+
+
+def is_cancelling():
+    return _cancel["requested"]
+
+
+def is_baking():
+    return _cancel["in_bake"]
 
 
 # Thank you Andrew Chinery https://blender.stackexchange.com/a/322063
-def get_macro(context):
+def get_macro(context, objects):
     # redefine the class to clear any previous steps assigned to the macro
     class OBJECT_OT_ez_bake_macro(bpy.types.Macro):
         bl_idname = "object.ez_bake_macro"
@@ -11,6 +48,8 @@ def get_macro(context):
         bl_options = {"INTERNAL", "MACRO"}
 
         steps = 0
+        # Estimated seconds for all steps
+        estimate = 0.0
 
     # unregister any previous macro
     if hasattr(bpy.types, "OBJECT_OT_ez_bake_macro"):
@@ -19,38 +58,7 @@ def get_macro(context):
     bpy.utils.register_class(OBJECT_OT_ez_bake_macro)
     macro = OBJECT_OT_ez_bake_macro
 
-    for obj in context.selected_objects:
-        macro.define("OBJECT_OT_ez_bake_select").properties.object_name = obj.name
-
-        obj_props = obj.ez_bake_object_props
-        if obj_props.bake_color:
-            add_bake(macro, context, "Color", "DIFFUSE")
-        if obj_props.bake_roughness:
-            add_bake(macro, context, "Roughness", "ROUGHNESS", non_color=True)
-        if obj_props.bake_metallic:
-            add_bake(macro, context, "Metallic", "EMIT", non_color=True)
-        if obj_props.bake_normal:
-            add_bake(macro, context, "Normal", "NORMAL", non_color=True)
-        if obj_props.bake_emission:
-            add_bake(macro, context, "Emission", "EMIT")
-        if obj_props.bake_alpha:
-            add_bake(macro, context, "Alpha", "EMIT", non_color=True)
-
-        if obj_props.use_overlays:
-            for layer_index, layer in enumerate(obj_props.overlay_layers):
-                # Alpha is needed
-                add_bake(macro, context, "Alpha", "EMIT", non_color=True, is_overlay=True, layer_index=layer_index)
-
-                if obj_props.bake_color:
-                    add_bake(macro, context, "Color", "DIFFUSE", is_overlay=True, layer_index=layer_index)
-                if obj_props.bake_roughness:
-                    add_bake(macro, context, "Roughness", "ROUGHNESS", non_color=True, is_overlay=True, layer_index=layer_index)
-                if obj_props.bake_metallic:
-                    add_bake(macro, context, "Metallic", "EMIT", non_color=True, is_overlay=True, layer_index=layer_index)
-                if obj_props.bake_normal:
-                    add_bake(macro, context, "Normal", "NORMAL", non_color=True, is_overlay=True, layer_index=layer_index)
-                if obj_props.bake_emission:
-                    add_bake(macro, context, "Emission", "EMIT", is_overlay=True, layer_index=layer_index)
+    add_objects(context, macro, objects)
 
     
     macro.define("OBJECT_OT_ez_bake_restore_selection").properties.object_names = "###".join([obj.name for obj in context.selected_objects])
@@ -58,7 +66,177 @@ def get_macro(context):
     return OBJECT_OT_ez_bake_macro
 
 
-def add_bake(macro, context, map_name, map_type, non_color=False, is_overlay=False, layer_index=-1):
+# Define the steps baking all objects, on a macro or a runner.StepQueue
+def add_objects(context, macro, objects):
+    scene_props = context.scene.ez_bake_scene_props
+    entries = journal.load() if scene_props.resume_bake or scene_props.rebake_changed else {}
+
+    names = "###".join([obj.name for obj in objects])
+    objects = get_representatives(context, objects)
+    # Let short jobs finish first
+    if scene_props.order_by_estimate:
+        objects.sort(key=lambda o: estimator.estimate_object(o, estimator.get_enabled_maps(o)))
+
+    plans = []
+    for obj in objects:
+        obj_props = obj.ez_bake_object_props
+        maps = [m for m in utils.MAPS if getattr(obj_props, f'bake_{m[0].lower()}')]
+
+        # Every UDIM tile is a job of its own
+        for tile in utils.get_tiles(obj, warn=True):
+            # Skip maps finished by a previous run, only re-bake the changed materials of others
+            tile_maps, regions = maps, {}
+            if entries:
+                tile_maps, regions = get_pending_maps(context, obj, maps, entries, tile)
+                if not tile_maps:
+                    print(f"[EZBake]: Skipping {obj.name}{utils.get_tile_suffix(tile)}, all maps already baked")
+                    continue
+
+            plans.append((obj, tile, tile_maps, regions))
+
+    # Parallel background workers each bake their share of the jobs
+    plans = background.get_worker_share(plans)
+
+    # Quick low resolution pass wired into the materials first, the full bake then replaces its images
+    # Region re-bakes merge into the existing images, which a preview would overwrite
+    if scene_props.use_preview:
+        for obj, tile, maps, regions in plans:
+            add_object(macro, obj, [m for m in maps if m[0] not in regions], tile=tile, is_preview=True)
+        macro.define("OBJECT_OT_ez_bake_preview_materials").properties.object_names = names
+
+    for obj, tile, maps, regions in plans:
+        add_object(macro, obj, maps, tile=tile, regions=regions)
+
+
+# regions: {map name: material names}, maps only re-baked for the faces using those materials
+# tile: UDIM tile the maps are baked for, 0 for a regular image
+def add_object(macro, obj, maps, tile=0, is_preview=False, regions=None):
+    regions = regions or {}
+    obj_props = obj.ez_bake_object_props
+    # Previews are never final, the full bake overwrites them
+    is_final = not is_preview
+
+    macro.define("OBJECT_OT_ez_bake_select").properties.object_name = obj.name
+
+    layers = []
+    if obj_props.use_overlays:
+        layers = list(range(len(obj_props.overlay_layers)))
+
+    # Every pass packs ORM after the last of its inputs
+    orm_maps = [m[0] for m in maps if m[0] in utils.ORM_MAPS]
+    last_orm_map = orm_maps[-1] if orm_maps else None
+
+    for map_name, map_type, non_color in maps:
+        add_bake(macro, obj, map_name, map_type, non_color=non_color, is_final=is_final and not layers,
+                 pack_orm=map_name == last_orm_map, tile=tile, is_preview=is_preview,
+                 region=regions.get(map_name))
+
+    for layer_index in layers:
+        is_last_layer = layer_index == layers[-1]
+
+        # Alpha is needed
+        add_bake(macro, obj, "Alpha", "EMIT", non_color=True, is_overlay=True, layer_index=layer_index,
+                 is_final=is_final and is_last_layer and obj_props.bake_alpha, tile=tile, is_preview=is_preview)
+
+        for map_name, map_type, non_color in maps:
+            if map_name == "Alpha":
+                continue
+            add_bake(macro, obj, map_name, map_type, non_color=non_color, is_overlay=True,
+                     layer_index=layer_index, is_final=is_final and is_last_layer,
+                     pack_orm=map_name == last_orm_map, tile=tile, is_preview=is_preview)
+
+    # Hand the bake targets back to the pool
+    macro.define("OBJECT_OT_ez_bake_release_images")
+
+
+# Objects sharing mesh, materials and bake settings give identical images,
+# bake only the first of every group and let the others use its images
+def get_representatives(context, objects):
+    representatives = {}
+    for obj in objects:
+        representative = representatives.setdefault(get_group_key(context, obj), obj)
+        obj.ez_bake_object_props.baked_as = representative.name
+        background.emit("BAKED_AS", obj.name, representative.name)
+        report.count_cache("shared_bakes", representative is not obj)
+
+    shared = len(objects) - len(representatives)
+    if shared > 0:
+        print(f"[EZBake]: {shared} objects share the bake of an identical object")
+    return list(representatives.values())
+
+
+def get_group_key(context, obj):
+    obj_props = obj.ez_bake_object_props
+    materials = [slot.material for slot in obj.material_slots]
+
+    # Overlays are projected in world space and modifiers change the baked mesh, never share those.
+    # Neither AO nor object dependent materials, they see the object's surroundings and placement
+    if obj.type != 'MESH' or (obj_props.use_overlays and len(obj_props.overlay_layers) > 0) \
+            or len(obj.modifiers) > 0 or obj_props.bake_ao \
+            or any(utils.material_depends_on_object(m) for m in materials):
+        return obj.name
+
+    return (
+        obj.data.name_full,
+        tuple(m.name_full if m is not None else "" for m in materials),
+        tuple(m[0] for m in utils.MAPS if getattr(obj_props, f'bake_{m[0].lower()}')),
+        journal.get_settings_signature(obj, context.scene),
+    )
+
+
+# Maps which still need baking, the finished ones are loaded from disk instead
+# With rebake_changed, finished maps whose materials were edited since are re-baked only where
+# the changed materials are, returned as {map name: changed material names}
+# UDIM tiles are journaled as {map}.{tile}
+def get_pending_maps(context, obj, maps, entries, tile=0):
+    scene_props = context.scene.ez_bake_scene_props
+    obj_props = obj.ez_bake_object_props
+    hashes = journal.get_material_hashes(obj)
+    suffix = utils.get_tile_suffix(tile)
+
+    pending_names = []
+    regions = {}
+    for map_name, map_type, non_color in maps:
+        entry = journal.verify(entries, obj.name, map_name + suffix,
+                               journal.get_settings_signature(obj, context.scene, map_name))
+        report.count_cache("journal", entry is not None)
+        if entry is None:
+            pending_names.append(map_name)
+        elif scene_props.rebake_changed:
+            changed = journal.get_changed_materials(entry, hashes)
+            # Overlays are projected over the whole object, those need a full bake
+            if changed is None or (changed and obj_props.use_overlays and len(obj_props.overlay_layers) > 0):
+                pending_names.append(map_name)
+            elif changed:
+                pending_names.append(map_name)
+                regions[map_name] = changed
+
+    # Packed images have to be redone when one of their inputs is
+    # ORM is packed after whichever of its inputs is baked last, the others are restored
+    if scene_props.pack_alpha and "Color" in pending_names and "Alpha" not in pending_names:
+        pending_names.append("Alpha")
+        if "Color" in regions:
+            regions["Alpha"] = regions["Color"]
+
+    # Region re-bakes merge into the previous image, so it is loaded as well
+    for map_name, map_type, non_color in maps:
+        if map_name not in pending_names or map_name in regions:
+            journal.restore_image(obj.name, map_name + suffix, entries[(obj.name, map_name + suffix)], non_color)
+
+    if scene_props.pack_orm and not any(m in pending_names for m in utils.ORM_MAPS):
+        entry = journal.verify(entries, obj.name, "ORM" + suffix,
+                               journal.get_settings_signature(obj, context.scene, "ORM"))
+        if entry is not None:
+            journal.restore_image(obj.name, "ORM" + suffix, entry, non_color=True)
+
+    if regions:
+        changed = sorted(set().union(*regions.values()))
+        print(f"[EZBake]: Re-baking {', '.join(regions)} of {obj.name}{suffix} where {', '.join(changed)} changed")
+    return [m for m in maps if m[0] in pending_names], regions
+
+
+def add_bake(macro, obj, map_name, map_type, non_color=False, is_overlay=False, layer_index=-1, is_final=True,
+             pack_orm=False, tile=0, is_preview=False, region=None):
     # Overlay pass setup
     if is_overlay:
         overlay_setup_step = macro.define("OBJECT_OT_ez_bake_overlay_setup")
@@ -70,16 +248,39 @@ def add_bake(macro, context, map_name, map_type, non_color=False, is_overlay=Fal
     setup_step.properties.map_type = map_type
     setup_step.properties.non_color = non_color
     setup_step.properties.is_overlay = is_overlay
+    setup_step.properties.tile = tile
+    setup_step.properties.is_preview = is_preview
+    setup_step.properties.region = "###".join(sorted(region or []))
 
     # Bake (Blender operator)
     bake_step = macro.define("OBJECT_OT_bake")
     bake_step.properties.type = map_type
     bake_step.properties.save_mode = "INTERNAL"
+    # Bake with the chosen UV map instead of whichever one is active, tiles with its moved copy
+    uv_map = obj.ez_bake_object_props.uv_map
+    if tile:
+        bake_step.properties.uv_layer = utils.TILE_UV_MAP
+    elif obj.type == 'MESH' and obj.data.uv_layers.get(uv_map) is not None:
+        bake_step.properties.uv_layer = uv_map
 
     # Save image
     save_step = macro.define("OBJECT_OT_ez_bake_post")
     save_step.properties.map_name = map_name
     save_step.properties.is_overlay = is_overlay
+    save_step.properties.is_final = is_final
+    save_step.properties.pack_orm = pack_orm
+    save_step.properties.tile = tile
+    save_step.properties.is_preview = is_preview
+    save_step.properties.region = "###".join(sorted(region or []))
+
+    triangles = estimator.get_triangle_count(obj)
+    if is_overlay:
+        triangles += estimator.get_overlay_triangle_count(obj, layer_index)
+    estimate = estimator.estimate(map_name, utils.get_bake_resolution(obj, map_name, is_preview),
+                                  utils.get_samples(obj, is_preview, map_name), triangles, is_overlay)
+    save_step.properties.estimate = estimate
+    save_step.properties.triangles = triangles
+    macro.estimate += estimate
 
     # Overlay pass cleanup
     if is_overlay:
@@ -118,6 +319,30 @@ class OBJECT_OT_ez_bake_restore_selection(bpy.types.Operator):
             context.view_layer.objects.active = obj
         return {'FINISHED'}
 
+class OBJECT_OT_ez_bake_release_images(bpy.types.Operator):
+    bl_idname = "object.ez_bake_release_images"
+    bl_options = {"INTERNAL"}
+    bl_label = "Release bake images"
+
+    def execute(self, context):
+        image_pool.release_all()
+        scratch.clear()
+        return {'FINISHED'}
+
+class OBJECT_OT_ez_bake_preview_materials(bpy.types.Operator):
+    bl_idname = "object.ez_bake_preview_materials"
+    bl_options = {"INTERNAL"}
+    bl_label = "Setup materials with the preview bake"
+
+    object_names: bpy.props.StringProperty()
+
+    def execute(self, context):
+        objects = [bpy.data.objects.get(name) for name in self.object_names.split("###")]
+        utils.setup_materials(context, [obj for obj in objects if obj is not None])
+        print("[EZBake]: Preview ready, refining")
+        background.emit("PREVIEW")
+        return {'FINISHED'}
+
 class OBJECT_OT_ez_bake_setup(bpy.types.Operator):
     bl_idname = "object.ez_bake_setup"
     bl_options = {"INTERNAL"}
@@ -126,75 +351,85 @@ class OBJECT_OT_ez_bake_setup(bpy.types.Operator):
     map_type: bpy.props.StringProperty()
     non_color: bpy.props.BoolProperty()
     is_overlay: bpy.props.BoolProperty()
-
+    # UDIM tile, 0 for a regular image
+    tile: bpy.props.IntProperty()
+    # Low resolution, single sample pass
+    is_preview: bpy.props.BoolProperty()
+    # Materials to bake, separated by ###, the others bake into a dummy image (empty = all)
+    region: bpy.props.StringProperty()
+
+    @report.time_step("setup")
+    @profiling.profile_execute
     def execute(self, context):
         obj = context.object
-        obj_props = obj.ez_bake_object_props
+
+        # Stops the macro before anything is set up
+        if is_cancelling():
+            return {"CANCELLED"}
+
+        estimator.start_step()
+
+        context.scene.cycles.samples = utils.get_samples(obj, self.is_preview, self.map_name)
+        tuning.apply(context, utils.get_bake_resolution(obj, self.map_name, self.is_preview))
+
+        if self.tile:
+            utils.setup_tile_uv_map(obj, obj.ez_bake_object_props.uv_map, self.tile)
 
         # Get image we will bake to
         image = self.get_or_create_image(context)
 
+        region = set(self.region.split("###")) if self.region else None
         for material in utils.get_materials(obj):
             utils.prepare_material(material, self.map_name)
-            utils.setup_image_node(material, self.map_name, image)
+            if region is None or material.name in region:
+                utils.setup_image_node(material, self.map_name, image)
+            else:
+                utils.setup_image_node(material, self.map_name, utils.get_region_dummy_image())
 
         if self.is_overlay:
-            bpy.ops.object.select_all(action='DESELECT')
-            context.scene.objects["EZBake_overlay_temp"].select_set(True)
-            obj.select_set(True)
-            context.view_layer.objects.active = obj
+            # The runner passes the overlay in its context override, the macro selects it
+            overlay_object = context.scene.objects[utils.OVERLAY_OBJECT]
+            if overlay_object not in context.selected_objects:
+                bpy.ops.object.select_all(action='DESELECT')
+                overlay_object.select_set(True)
+                obj.select_set(True)
+                context.view_layer.objects.active = obj
             context.scene.render.bake.use_selected_to_active = True
             context.scene.render.bake.use_clear = False
             context.scene.render.bake.margin = 0
         else:
             context.scene.render.bake.use_selected_to_active = False
             context.scene.render.bake.use_clear = True
-            context.scene.render.bake.margin = 16
+            # Margin is added by the dilation post-process
+            context.scene.render.bake.margin = 0
 
+        _cancel["in_bake"] = True
         return {"FINISHED"}
 
 
     def get_or_create_image(self, context):
         obj = context.object
-        obj_props = obj.ez_bake_object_props
         scene_props = context.scene.ez_bake_scene_props
-        image_name = f'{obj.name}_{self.map_name}'
+        image_name = f'{obj.name}_{self.map_name}{utils.get_tile_suffix(self.tile)}'
         if self.is_overlay:
             image_name += "_overlay"
 
-        # Get texture image
-        image = bpy.data.images.get(image_name)
-
-        # If resolution has changed
-        if image is not None and \
-                (image.size[0] != int(obj_props.resolution) or image.size[1] != int(obj_props.resolution)):
-            bpy.data.images.remove(image)
-            image = None
-
-        # Create new image
-        if image is None:
-            alpha = False
-            color = (1, 0, 1, 1)
-
-            # Contributing pass needs alpha
-            if self.is_overlay:
-                alpha = True
-                color = (0, 0, 0, 0)
+        alpha = False
+        color = (1, 0, 1, 1)
 
-            # Color map needs alpha if pack alpha is enabled
-            if scene_props.pack_alpha and self.map_name == "Color":
-                alpha = True
-
-            bpy.ops.image.new(name=image_name,
-                              width=int(obj_props.resolution), height=int(obj_props.resolution),
-                              alpha=alpha, color=color)
+        # Contributing pass needs alpha
+        if self.is_overlay:
+            alpha = True
+            color = (0, 0, 0, 0)
 
-            image = bpy.data.images[image_name]
+        # Color map needs alpha if pack alpha is enabled
+        if scene_props.pack_alpha and self.map_name == "Color":
+            alpha = True
 
-        if self.non_color:
-            image.colorspace_settings.name = 'Non-Color'
+        colorspace = 'Non-Color' if self.non_color else 'sRGB'
 
-        return image
+        return image_pool.acquire(image_name, utils.get_bake_resolution(obj, self.map_name, self.is_preview), alpha,
+                                  colorspace, color)
 
 
 class OBJECT_OT_ez_bake_post(bpy.types.Operator):
@@ -204,62 +439,187 @@ class OBJECT_OT_ez_bake_post(bpy.types.Operator):
 
     map_name: bpy.props.StringProperty()
     is_overlay: bpy.props.BoolProperty(default=False)
-
+    # Last pass for this map, the result is recorded in the journal
+    is_final: bpy.props.BoolProperty(default=True)
+    # Last ORM input of the pass, packs the ORM image
+    pack_orm: bpy.props.BoolProperty(default=False)
+    tile: bpy.props.IntProperty(default=0)
+    # Estimated seconds for this step, used for the progress ETA
+    estimate: bpy.props.FloatProperty(default=0.0)
+    # Triangles the estimate was made for, recorded with the timing so the model fits what it predicts from
+    triangles: bpy.props.IntProperty(default=0)
+    is_preview: bpy.props.BoolProperty(default=False)
+    # Only the faces of these materials were baked (see OBJECT_OT_ez_bake_setup)
+    region: bpy.props.StringProperty()
+
+    @report.time_step("post")
+    @profiling.profile_execute
     def execute(self, context):
         obj = context.object
         obj_props = obj.ez_bake_object_props
         scene_props = context.scene.ez_bake_scene_props
-        image_name = f'{obj.name}_{self.map_name}'
+        suffix = utils.get_tile_suffix(self.tile)
+        image_name = f'{obj.name}_{self.map_name}{suffix}'
 
         for material in utils.get_materials(obj):
             utils.restore_material(material, self.map_name)
             utils.cleanup_image_node(material, self.map_name)
+
+        if self.tile:
+            utils.remove_tile_uv_map(obj.data)
+
+        # The materials are back, a cancelled run doesn't save what it baked.
+        # The next setup step stops the macro
+        _cancel["in_bake"] = False
+        if is_cancelling():
+            return {"FINISHED"}
+
+        # DENOISING
+        if not self.is_overlay and not self.is_preview and obj_props.use_denoise \
+                and self.map_name in denoise.DENOISE_MAPS:
+            image = image_pool.get(image_name)
+            mask = utils.get_uv_island_mask(obj, obj_props.uv_map, *image.size, tile=self.tile)
+            denoise.denoise_image(image, mask)
     
+        # AO UPSAMPLING
+        # Baked at a fraction of the resolution, brought up to full resolution along the normal map's edges
+        if self.map_name == "AO":
+            self.upsample_ao(context, f'{image_name}_overlay' if self.is_overlay else image_name)
+
         # OVERLAY IMAGES
         if self.is_overlay:
             # base image should already exist
-            base_image = bpy.data.images[f'{obj.name}_{self.map_name}']
-            overlay_image = bpy.data.images[f'{obj.name}_{self.map_name}_overlay']
-            mask_image = bpy.data.images[f'{obj.name}_Alpha_overlay']
+            base_image = image_pool.get(image_name)
+            overlay_name = f'{image_name}_overlay'
+            mask_name = f'{obj.name}_Alpha{suffix}_overlay'
+            overlay_image = image_pool.get(overlay_name)
+
+            # Spill the pass to a scratch file and give its image back right away,
+            # the mask stays on disk for the other maps of this layer
+            overlay = scratch.store(overlay_name, overlay_image, precision.get_dtype(self.map_name))
+            image_pool.release(overlay_image)
 
             if self.map_name == "Alpha":
-                utils.overlay_images(base_image, overlay_image, mask_image)
-            else: 
-                utils.overlay_images(base_image, overlay_image, mask_image)
-                bpy.data.images.remove(overlay_image)
-            base_image.save()
-            # Show new image in any open editor
-            for area in context.screen.areas:
-                if area.type == 'IMAGE_EDITOR':
-                    area.spaces.active.image = base_image
-            print(f"EZBAKE: Finished baking {base_image.name} Overlay")
+                utils.overlay_images(base_image, overlay, overlay, is_alpha=True)
+            else:
+                utils.overlay_images(base_image, overlay, scratch.get(mask_name))
+                scratch.remove(overlay_name)
+            # Show new image in any open editor, there are no windows when running headless
+            for window in context.window_manager.windows:
+                for area in window.screen.areas:
+                    if area.type == 'IMAGE_EDITOR':
+                        area.spaces.active.image = base_image
+            print(f"EZBAKE: Finished baking {image_pool.get_target_name(base_image)} Overlay")
         
+        # REGION MERGE
+        # Keep the previous texels everywhere but under the re-baked materials
+        if self.region:
+            target = image_pool.get(image_name)
+            previous = bpy.data.images.get(image_name)
+            if previous is not None and previous != target and tuple(previous.size) == tuple(target.size):
+                materials = set(self.region.split("###"))
+                mask = utils.get_uv_island_mask(obj, obj_props.uv_map, *target.size, materials=materials,
+                                                tile=self.tile)
+                utils.merge_region(target, previous, mask, self.map_name)
+
+        # DILATION
+        # After denoising and compositing, so overlays don't leave seams in the margin either
+        utils.dilate_image(obj, image_pool.get(image_name), self.map_name, self.tile)
+
+        materials = journal.get_material_hashes(obj) if self.is_final else None
+
         # ALPHA PACKING
         # only works because we always do alpha after color
-        if self.map_name == "Alpha" and context.scene.ez_bake_scene_props.pack_alpha:
-            utils.pack_alpha(bpy.data.images.get(
-                f'{obj.name}_Color'), bpy.data.images.get(f'{obj.name}_Alpha'))
-            bpy.data.images.get(f'{obj.name}_Color').save()
+        # A preview doesn't pack into a Color image restored from a previous run, the full bake does
+        if self.map_name == "Alpha" and context.scene.ez_bake_scene_props.pack_alpha and \
+                (not self.is_preview or image_pool.get_checked_out(f'{obj.name}_Color{suffix}') is not None):
+            color_image = image_pool.get(f'{obj.name}_Color{suffix}')
+            utils.pack_alpha(color_image, image_pool.get(f'{obj.name}_Alpha{suffix}'))
+            self.save_image(context, color_image, "Color", lods=self.is_final)
+            if self.is_final:
+                journal.record(obj.name, "Color" + suffix, color_image,
+                               journal.get_settings_signature(obj, context.scene, "Color"), materials)
  
         # ORM PACKING
-        # only works because we always do metallic after roughness and AO
-        if self.map_name == "Metallic" and context.scene.ez_bake_scene_props.pack_orm:
-            image_name = f'{obj.name}_ORM'
-            image = utils.combine_orm(bpy.data.images.get(f'{obj.name}_AO'), bpy.data.images.get(
-                f'{obj.name}_Roughness'), bpy.data.images.get(f'{obj.name}_Metallic'), image_name)
-            self.save_image(context, image)
+        # after the last input of the pass, the other inputs are baked or restored from the journal by then
+        if self.pack_orm and context.scene.ez_bake_scene_props.pack_orm:
+            ao_image = image_pool.get(f'{obj.name}_AO{suffix}') if obj_props.bake_ao else None
+            orm_image = utils.combine_orm(ao_image, image_pool.get(f'{obj.name}_Roughness{suffix}'),
+                                          image_pool.get(f'{obj.name}_Metallic{suffix}'), f'{obj.name}_ORM{suffix}')
+            self.save_image(context, orm_image, "ORM", lods=self.is_final)
+            image_pool.free_saved(orm_image)
+            if self.is_final:
+                journal.record(obj.name, "ORM" + suffix, orm_image,
+                               journal.get_settings_signature(obj, context.scene, "ORM"), materials)
 
         # REGULAR
-        self.save_image(context, bpy.data.images.get(image_name))
+        image = self.save_image(context, image_pool.get(image_name), self.map_name, lods=self.is_final)
+        if self.is_final:
+            journal.record(obj.name, self.map_name + suffix, image,
+                           journal.get_settings_signature(obj, context.scene, self.map_name), materials)
 
-        context.scene.ez_bake_progress.increment()
+        estimator.finish_step(self.map_name, utils.get_bake_resolution(obj, self.map_name, self.is_preview),
+                              context.scene.cycles.samples, self.triangles, self.is_overlay)
+
+        report.add_map(obj.name + suffix, self.map_name, utils.get_resolution(obj, self.is_preview) ** 2,
+                       self.is_final)
+        context.scene.ez_bake_progress.increment(self.estimate)
+        background.emit_progress(context.scene.ez_bake_progress)
 
         return {"FINISHED"}
 
 
-    def save_image(self, context, image):
+    # Swap the reduced resolution AO target for a full resolution one under the same name
+    def upsample_ao(self, context, name):
+        obj = context.object
+        resolution = utils.get_resolution(obj, self.is_preview)
+        image = image_pool.get(name)
+        if image.size[0] == resolution:
+            return
+
+        normal_image = None
+        if obj.ez_bake_object_props.bake_normal:
+            normal_image = image_pool.get(f'{obj.name}_Normal{utils.get_tile_suffix(self.tile)}')
+        pixels = utils.upsample_pixels(obj, image, resolution, "AO", normal_image, self.tile)
+
+        image = image_pool.acquire(name, resolution, self.is_overlay, 'Non-Color', (1, 1, 1, 1))
+        utils.write_pixels(image, pixels)
+
+    # Save to the texture directory, lods also writes the LOD set of the map
+    def save_image(self, context, image, map_name, lods=False):
         scene_props = context.scene.ez_bake_scene_props
 
+        name = image_pool.get_target_name(image)
+        self.write_image(context, image, self.get_file_name(name, self.is_preview), map_name)
+        if not self.is_preview:
+            self.remove_preview(image, name)
+        background.emit_image(name, image)
+        print(f"[EZBake]: Finished baking {name}")
+
+        if lods and scene_props.generate_lods:
+            self.save_lods(context, image, name, map_name)
+
+        return image
+
+    # Previews are written next to the textures instead of over them, {name}_preview ({name}_preview.{tile}),
+    # so a cancelled run leaves the previous full bake and its journal entries intact
+    def get_file_name(self, name, is_preview):
+        if not is_preview:
+            return name
+        suffix = utils.get_tile_suffix(self.tile)
+        return f'{name[:len(name) - len(suffix)]}_preview{suffix}'
+
+    # The preview of a map is deleted once its full bake is saved next to it
+    def remove_preview(self, image, name):
+        directory, filename = os.path.split(bpy.path.abspath(image.filepath_raw))
+        preview = os.path.join(directory, self.get_file_name(name, True) + os.path.splitext(filename)[1])
+        if os.path.exists(preview):
+            os.remove(preview)
+
+    def write_image(self, context, image, name, map_name):
+        scene_props = context.scene.ez_bake_scene_props
+        start = time.perf_counter()
+
         table = {
             'JPG': ['jpg', 'JPEG'],
             'PNG': ['png', 'PNG'],
@@ -267,16 +627,60 @@ class OBJECT_OT_ez_bake_post(bpy.types.Operator):
 
         prefs = context.preferences.addons[__package__].preferences
         prefs_directory = prefs.texture_directory
-        file_ext = table[scene_props.file_format][0]
-        format = table[scene_props.file_format][1]
 
-        image.filepath_raw = f'//{prefs_directory}/{image.name}.{file_ext}'
-        image.file_format = format
+        # Blender can't write DDS, encode straight from the pixel buffer
+        if scene_props.file_format == 'DDS':
+            image.filepath_raw = f'//{prefs_directory}/{name}.dds'
+            self.write_dds(context, image, map_name)
+        else:
+            file_ext = table[scene_props.file_format][0]
+            format = table[scene_props.file_format][1]
 
-        image.save()
-        print(f"[EZBake]: Finished baking {image.name}")
+            image.filepath_raw = f'//{prefs_directory}/{name}.{file_ext}'
+            image.file_format = format
 
-        return image
+            image.save()
+
+        # Counted for the map of this step, packed images are written by the step of their last input
+        filepath = bpy.path.abspath(image.filepath_raw)
+        report.add_io(self.map_name, time.perf_counter() - start,
+                      os.path.getsize(filepath) if os.path.exists(filepath) else 0)
+
+    def write_dds(self, context, image, map_name):
+        scene_props = context.scene.ez_bake_scene_props
+        width, height = image.size
+
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+
+        format = dds.get_format(map_name, scene_props.dds_color_format, has_alpha=image.depth in (32, 128))
+        dds.save_dds(bpy.path.abspath(image.filepath_raw), pixels.reshape(height, width, 4), format,
+                     srgb=image.colorspace_settings.name == 'sRGB', kind=lod.get_filter_kind(map_name),
+                     pool=dds.get_pool())
+
+    # Downsample the full resolution bake into {name}_{resolution} textures ({name}_{resolution}.{tile} for tiles)
+    def save_lods(self, context, image, name, map_name):
+        scene_props = context.scene.ez_bake_scene_props
+        width, height = image.size
+        suffix = utils.get_tile_suffix(self.tile)
+        name = name[:len(name) - len(suffix)]
+
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(height, width, 4)
+
+        for pixels in lod.mip_chain(pixels, lod.get_filter_kind(map_name), levels=scene_props.lod_count):
+            lod_height, lod_width = pixels.shape[:2]
+            lod_name = f'{name}_{lod_width}{suffix}'
+
+            lod_image = bpy.data.images.new(lod_name, width=lod_width, height=lod_height,
+                                            alpha=image.depth in (32, 128))
+            lod_image.colorspace_settings.name = image.colorspace_settings.name
+            lod_image.pixels.foreach_set(pixels.ravel())
+
+            self.write_image(context, lod_image, lod_name, map_name)
+            bpy.data.images.remove(lod_image)
+            print(f"[EZBake]: Finished LOD {lod_name}")
 
 
 
@@ -285,9 +689,13 @@ def register():
     bpy.utils.register_class(OBJECT_OT_ez_bake_post)
     bpy.utils.register_class(OBJECT_OT_ez_bake_select)
     bpy.utils.register_class(OBJECT_OT_ez_bake_restore_selection)
+    bpy.utils.register_class(OBJECT_OT_ez_bake_release_images)
+    bpy.utils.register_class(OBJECT_OT_ez_bake_preview_materials)
 
 def unregister():
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_setup)
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_post)
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_select)
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_restore_selection)
+    bpy.utils.unregister_class(OBJECT_OT_ez_bake_release_images)
+    bpy.utils.unregister_class(OBJECT_OT_ez_bake_preview_materials)
@@ -1,6 +1,22 @@
+import os
+import sys
+
 import bpy
 from . import utils
 from . import macro
+from . import journal
+from . import dds
+from . import image_pool
+from . import scratch
+from . import tuning
+from . import background
+from . import profiling
+from . import runner
+from . import report
+from . import estimator
+
+# Timer ticks a cancelled run waits for the post step of a bake that isn't running anymore
+CANCEL_IDLE_TICKS = 5
 
 
 class OBJECT_OT_ez_bake(bpy.types.Operator):
@@ -8,43 +24,178 @@ class OBJECT_OT_ez_bake(bpy.types.Operator):
     bl_idname = "object.ez_bake"
     bl_options = {'REGISTER', 'UNDO'}
 
+    # Bake the objects of the batch collections through the step runner instead of the selection
+    use_collections: bpy.props.BoolProperty(
+        name="Collections",
+        description="Bake every mesh object in the collections marked for batch baking",
+        default=False, options={'SKIP_SAVE'})
+
     _timer = None
-    original_render_engine = bpy.props.StringProperty()
-    original_cycles_samples = bpy.props.IntProperty()
+    # Scene settings from before the bake
+    _settings = None
+    # Names of the baked objects
+    _objects = None
+    # runner.StepQueue of a collection batch
+    _queue = None
+    # Object settings replaced by collection presets, put back when the run ends
+    _presets = None
+    # Timer ticks without a bake job since cancelling, see is_cancelled
+    _idle = None
 
     def modal(self, context, event):
-        if context.scene.ez_bake_progress.is_finished():
-            # Restore render settings
-            context.scene.render.engine = self.original_render_engine
-            context.scene.cycles.samples = self.original_cycles_samples
+        if self._idle is not None:
+            return self.modal_cancelling(context, event)
 
-            utils.setup_materials(context)
+        if self._queue is not None and event.type == 'TIMER':
+            try:
+                runner.advance(context, self._queue)
+            except Exception as e:
+                self.report({"ERROR"}, str(e))
+                self.cancel(context)
+                return {"CANCELLED"}
+
+        if context.scene.ez_bake_progress.is_finished() and (self._queue is None or self._queue.is_empty()):
+            self.finish(context)
 
             self.cancel(context)
             return {"FINISHED"}
 
+        # The bake job gets to finish, cleaning up under it would leave its materials half set up
         if event.type in {"RIGHTMOUSE", "ESC"}:
+            self._idle = 0
+            macro.request_cancel()
+            if self._queue is not None:
+                runner.stop(self._queue, macro.is_baking())
+            self.report({"INFO"}, "Cancelling after the current bake")
+            return {"RUNNING_MODAL"}
+
+        return {"PASS_THROUGH"}
+
+    # Only the post step of the running bake is left, the macro stops at its next setup step
+    def modal_cancelling(self, context, event):
+        if event.type != 'TIMER':
+            # Keeps the cancelling key from reaching the bake job
+            return {"RUNNING_MODAL"} if event.type in {"RIGHTMOUSE", "ESC"} else {"PASS_THROUGH"}
+
+        try:
+            if self._queue is not None:
+                runner.advance(context, self._queue)
+        except Exception as e:
+            self.report({"ERROR"}, str(e))
+            runner.stop(self._queue, False)
+
+        if self.is_cancelled():
             self.cancel(context)
+            print("[EZBake]: Bake cancelled")
             return {"CANCELLED"}
-
         return {"PASS_THROUGH"}
 
+    def is_cancelled(self):
+        if bpy.app.is_job_running('OBJECT_BAKE'):
+            self._idle = 0
+            return False
+        self._idle += 1
+        if self._queue is not None and not self._queue.is_empty():
+            return False
+        # A bake that failed to start never reaches its post step
+        return not macro.is_baking() or self._idle >= CANCEL_IDLE_TICKS
+
     def cancel(self, context):
         context.window_manager.event_timer_remove(self._timer)
         self._timer = None
+        self._idle = None
+        self.cleanup(context)
+
+    # Everything a run leaves behind, whether it finished or not
+    def cleanup(self, context):
+        self._queue = None
+        macro.reset_cancel()
 
         context.scene.ez_bake_progress.reset()
+        dds.shutdown_pool()
+        image_pool.release_all()
+        scratch.clear()
+        utils.clear_uv_cache()
+        utils.remove_tile_uv_maps()
+        utils.remove_overlay_object()
+        self.restore_settings(context)
+        self.restore_presets()
+        profiling.finish_run()
+        report.discard_run()
+
+    def finish(self, context):
+        self.restore_settings(context)
+
+        image_pool.release_all()
+        scratch.clear()
+        utils.clear_uv_cache()
+        utils.remove_region_dummy_image()
+        utils.remove_tile_uv_maps()
+
+        objects = [bpy.data.objects.get(name) for name in self._objects]
+        utils.setup_materials(context, [obj for obj in objects if obj is not None])
+        self.restore_presets()
+
+        report.finish_run()
 
     def execute(self, context):
-        obj = context.object
+        macro.reset_cancel()
 
-        self.check_materials(context)
+        if background.is_running():
+            self.report({"WARNING"}, "A background bake is still running")
+            return {"CANCELLED"}
+
+        # A fresh run starts a new journal, re-baking changed materials builds on the previous one
+        # Background workers share the journal of the bake that started them
+        scene_props = context.scene.ez_bake_scene_props
+        is_fresh = not scene_props.resume_bake and not scene_props.rebake_changed
+
+        if self.use_collections:
+            objects = utils.get_batch_objects(context)
+            if not objects:
+                self.report({"WARNING"}, "No mesh objects in the collections marked for batch baking")
+                return {"CANCELLED"}
+        else:
+            objects = list(context.selected_objects)
+        self._objects = [obj.name for obj in objects]
+
+        # Bake a snapshot in another Blender process, this session isn't touched
+        if scene_props.use_background and not bpy.app.background:
+            if not bpy.data.filepath:
+                self.report({"ERROR"}, "Save the file before baking in the background")
+                return {"CANCELLED"}
+            if is_fresh:
+                journal.reset()
+            background.start(context, objects, self.use_collections)
+            return {"FINISHED"}
+
+        # Collection presets only hold for this run, the child of a background bake applies them itself
+        if self.use_collections:
+            self._presets = utils.apply_presets(context)
+
+        profiling.start_run(context)
+
+        self.check_materials(objects)
+
+        # Automatic resolutions are measured on the meshes as they are now
+        utils.clear_area_cache()
 
         self.general_bake_setup(context)
 
         context.scene.ez_bake_progress.reset()
 
-        _macro = macro.get_macro(context)
+        if is_fresh and not background.is_child():
+            journal.reset()
+
+        self.start_report(context, objects)
+
+        # Batches run their steps with context overrides, the selection isn't touched
+        if self.use_collections:
+            self._queue = runner.StepQueue()
+            macro.add_objects(context, self._queue, objects)
+            _macro = self._queue
+        else:
+            _macro = macro.get_macro(context, objects)
 
         # if obj.ez_bake_use_contributing_objects:
         #     macro.define("OBJECT_OT_ez_bake_contrib_setup")
@@ -52,9 +203,25 @@ class OBJECT_OT_ez_bake(bpy.types.Operator):
         # if obj.ez_bake_use_contributing_objects:
         #     macro.define("OBJECT_OT_ez_bake_contrib_cleanup")
 
-        context.scene.ez_bake_progress.total = _macro.steps
+        context.scene.ez_bake_progress.start(_macro.steps, _macro.estimate)
+        background.emit("START", _macro.steps, _macro.estimate)
+        print(f"[EZBake]: Baking {_macro.steps} maps, estimated {utils.format_duration(_macro.estimate)}")
+
+        # Headless (blender -b), no event loop to drive the modal operator so run every step in place
+        # A failing step still removes the overlay object, tile UV maps, scratch files and Cycles settings
+        if bpy.app.background:
+            try:
+                if self._queue is not None:
+                    runner.advance(context, self._queue, blocking=True)
+                else:
+                    bpy.ops.object.ez_bake_macro()
+                self.finish(context)
+            finally:
+                self.cleanup(context)
+            return {"FINISHED"}
 
-        bpy.ops.object.ez_bake_macro("INVOKE_DEFAULT")
+        if self._queue is None:
+            bpy.ops.object.ez_bake_macro("INVOKE_DEFAULT")
 
         self._timer = context.window_manager.event_timer_add(
             0.1, window=context.window)
@@ -62,17 +229,45 @@ class OBJECT_OT_ez_bake(bpy.types.Operator):
 
         return {"RUNNING_MODAL"}
 
-    def check_materials(self, context):
-        for material in utils.get_materials(context.object):
+    # Throughput report of this run, runs doing the same work share a job key in the history
+    # The key is completed with the maps the run bakes, a resume skipping finished maps is another job
+    def start_report(self, context, objects):
+        scene = context.scene
+        scene_props = scene.ez_bake_scene_props
+
+        filepath = background.get_project_path()
+        history_path = os.path.splitext(filepath)[0] + ".ezbake_runs.jsonl" if filepath else None
+        worker = os.environ.get(background.WORKER_ENV, "")
+
+        description = {
+            "objects": sorted([obj.name, journal.get_settings_signature(obj, scene), estimator.get_enabled_maps(obj)]
+                              for obj in objects),
+            "worker": worker,
+            "preview": scene_props.use_preview,
+            "rebake_changed": scene_props.rebake_changed,
+            "lods": scene_props.lod_count if scene_props.generate_lods else 0,
+            "dds_color_format": scene_props.dds_color_format,
+        }
+        report.start_run(history_path, description, {
+            "blender": bpy.app.version_string,
+            "addon": ".".join(str(v) for v in sys.modules[__package__].bl_info["version"]),
+            "device": scene.cycles.device,
+            "headless": bpy.app.background,
+            "worker": worker,
+            "objects": len(objects),
+        })
+
+    def check_materials(self, objects):
+        materials = {material for obj in objects for material in utils.get_materials(obj)}
+        for material in sorted(materials, key=lambda m: m.name):
             if not utils.check_material(material):
                 self.report({"WARNING"}, f'Material {material.name} has none or multiple BSDFs, skipping')
 
+    # Samples and tuned performance settings are set per object by the setup step
     def general_bake_setup(self, context):
-        self.original_render_engine = context.scene.render.engine
-        context.scene.render.engine = 'CYCLES'
+        self._settings = tuning.snapshot(context.scene)
 
-        self.original_cycles_samples = context.scene.cycles.samples
-        context.scene.cycles.samples = context.object.ez_bake_object_props.samples
+        context.scene.render.engine = 'CYCLES'
 
         context.scene.render.bake.use_pass_direct = False
         context.scene.render.bake.use_pass_indirect = False
@@ -81,10 +276,36 @@ class OBJECT_OT_ez_bake(bpy.types.Operator):
         context.scene.render.bake.use_selected_to_active = False
         context.scene.render.bake.use_clear = True
 
+    def restore_settings(self, context):
+        if self._settings is not None:
+            tuning.restore(context.scene, self._settings)
+            self._settings = None
+
+    def restore_presets(self):
+        if self._presets is not None:
+            utils.restore_presets(self._presets)
+            self._presets = None
+
+
+class OBJECT_OT_ez_bake_cancel_background(bpy.types.Operator):
+    bl_label = "Cancel Background Bake"
+    bl_idname = "object.ez_bake_cancel_background"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return background.is_running()
+
+    def execute(self, context):
+        background.cancel()
+        return {"FINISHED"}
+
 
 def register():
     bpy.utils.register_class(OBJECT_OT_ez_bake)
+    bpy.utils.register_class(OBJECT_OT_ez_bake_cancel_background)
 
 
 def unregister():
     bpy.utils.unregister_class(OBJECT_OT_ez_bake)
+    bpy.utils.unregister_class(OBJECT_OT_ez_bake_cancel_background)
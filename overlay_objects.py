@@ -8,6 +8,7 @@ class EzBakeOverlayObject(bpy.types.PropertyGroup):
 class EzBakeOverlayLayer(bpy.types.PropertyGroup):
     enabled: bpy.props.BoolProperty(name="Enabled", default=True)
     objects: bpy.props.CollectionProperty(type=EzBakeOverlayObject)
+    active_object_index: bpy.props.IntProperty(name="Active Object", default=0)
 
 # Add a layer to the list
 class OBJECT_OT_ez_bake_add_overlay_layer(bpy.types.Operator):
@@ -16,7 +17,10 @@ class OBJECT_OT_ez_bake_add_overlay_layer(bpy.types.Operator):
     bl_options = {"INTERNAL", "UNDO"}
 
     def execute(self, context):
-        context.object.ez_bake_object_props.overlay_layers.add()
+        obj_props = context.object.ez_bake_object_props
+        layer = obj_props.overlay_layers.add()
+        layer.name = f"Layer {len(obj_props.overlay_layers) - 1}"
+        obj_props.active_layer_index = len(obj_props.overlay_layers) - 1
         return {'FINISHED'}
 
 # Remove a layer from the list
@@ -28,7 +32,12 @@ class OBJECT_OT_ez_bake_remove_overlay_layer(bpy.types.Operator):
     index: bpy.props.IntProperty()
 
     def execute(self, context):
-        context.object.ez_bake_object_props.overlay_layers.remove(self.index)
+        obj_props = context.object.ez_bake_object_props
+        if not 0 <= self.index < len(obj_props.overlay_layers):
+            return {'CANCELLED'}
+
+        obj_props.overlay_layers.remove(self.index)
+        obj_props.active_layer_index = min(obj_props.active_layer_index, len(obj_props.overlay_layers) - 1)
 
         return {'FINISHED'}
 
@@ -41,7 +50,9 @@ class OBJECT_OT_ez_bake_add_overlay_object(bpy.types.Operator):
     layer_index: bpy.props.IntProperty()
 
     def execute(self, context):
-        context.object.ez_bake_object_props.overlay_layers[self.layer_index].objects.add()
+        layer = context.object.ez_bake_object_props.overlay_layers[self.layer_index]
+        layer.objects.add()
+        layer.active_object_index = len(layer.objects) - 1
         return {'FINISHED'}
 
 # Remove an object from a layer
@@ -54,7 +65,12 @@ class OBJECT_OT_ez_bake_remove_overlay_object(bpy.types.Operator):
     object_index: bpy.props.IntProperty()
 
     def execute(self, context):
-        context.object.ez_bake_object_props.overlay_layers[self.layer_index].objects.remove(self.object_index)
+        layer = context.object.ez_bake_object_props.overlay_layers[self.layer_index]
+        if not 0 <= self.object_index < len(layer.objects):
+            return {'CANCELLED'}
+
+        layer.objects.remove(self.object_index)
+        layer.active_object_index = min(layer.active_object_index, len(layer.objects) - 1)
         return {'FINISHED'}
 
 def register():
@@ -1,4 +1,47 @@
+import fnmatch
+
 import bpy
+from . import utils
+from . import estimator
+from . import background
+
+
+def get_layer_name(layer, layer_index):
+    return layer.name or f"Layer {layer_index}"
+
+
+# Only the visible rows of these lists are drawn, so large overlay setups stay cheap to redraw
+class EZBAKE_UL_overlay_layers(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "enabled", text="")
+        if item.name:
+            row.prop(item, "name", text="", emboss=False)
+        else:
+            row.label(text=get_layer_name(item, index))
+        row.label(text=str(len(item.objects)), icon='OBJECT_DATA')
+
+
+class EZBAKE_UL_overlay_objects(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        layout.prop(item, "object", text="", icon='OBJECT_DATA')
+
+    # Filter and sort by the referenced object's name
+    def filter_items(self, context, data, propname):
+        items = getattr(data, propname)
+        names = [item.object.name if item.object is not None else "" for item in items]
+
+        flags = [self.bitflag_filter_item] * len(items)
+        if self.filter_name:
+            pattern = f'*{self.filter_name.lower()}*'
+            flags = [self.bitflag_filter_item if fnmatch.fnmatchcase(name.lower(), pattern) else 0
+                     for name in names]
+
+        order = []
+        if self.use_filter_sort_alpha:
+            order = bpy.types.UI_UL_list.sort_items_helper(list(enumerate(names)), key=lambda item: item[1].lower())
+
+        return flags, order
 
 
 class OBJECT_PT_ez_bake(bpy.types.Panel):
@@ -27,15 +70,40 @@ class OBJECT_PT_ez_bake(bpy.types.Panel):
         # OPERATOR BUTTON
         box = layout.row()
         box.scale_y = 2.0
-        box.operator("object.ez_bake")
+        if background.is_running():
+            box.operator("object.ez_bake_cancel_background", icon='CANCEL')
+        else:
+            box.operator("object.ez_bake")
+        row = layout.row()
+        row.prop(scene_props, "resume_bake")
+        row.prop(scene_props, "order_by_estimate")
+        row.prop(scene_props, "use_background")
+        if scene_props.use_background:
+            layout.prop(scene_props, "background_workers")
+        layout.prop(scene_props, "rebake_changed")
+        row = layout.row()
+        row.prop(scene_props, "use_preview")
+        sub = row.row()
+        sub.active = scene_props.use_preview
+        sub.prop(scene_props, "preview_resolution", text="")
 
-        # PROGRESS BAR
+        # ESTIMATED TIME
         progress = context.scene.ez_bake_progress
+        if progress.is_finished():
+            estimate = estimator.get_panel_estimate(context.selected_objects, context.scene)
+            layout.label(text=f"Estimated time: {utils.format_duration(estimate)}", icon='TIME')
+
+        # PROGRESS BAR
         if not progress.is_finished():
             layout.progress(type='BAR',
                             factor=progress.get_progress_fac(),
                             text=progress.get_progress_string())
-            layout.active = False
+            # A background bake leaves this session free to edit
+            if not background.is_running():
+                layout.active = False
+
+        if obj_props.baked_as and obj_props.baked_as != obj.name:
+            layout.label(text=f"Shares the bake of {obj_props.baked_as}", icon='LINKED')
 
         # MAPS
         header, panel = layout.panel("ez_bake_maps")
@@ -48,72 +116,110 @@ class OBJECT_PT_ez_bake(bpy.types.Panel):
             panel.prop(obj_props, "bake_normal")
             panel.prop(obj_props, "bake_emission")
             panel.prop(obj_props, "bake_alpha")
+            panel.prop(obj_props, "bake_ao")
+            if obj_props.bake_ao:
+                row = panel.row()
+                row.label(text="AO")
+                row.prop(obj_props, "ao_scale", text="")
+                row.prop(obj_props, "ao_samples", text="Samples")
 
 
         # SAMPLES
         row = layout.row()
         row.label(text="Samples")
         row.prop(obj_props, "samples", text="")
+        row.prop(obj_props, "use_denoise", text="", icon='SHADERFX')
         # RESOLUTION
         row = layout.row()
         row.label(text="Resolution")
         row.prop(obj_props, "resolution", text="")
+        if obj_props.resolution == 'AUTO':
+            row.label(text=str(utils.get_resolution(obj)))
         # FILE FORMAT
         layout.prop(scene_props, "file_format", expand=True)
+        if scene_props.file_format == 'DDS':
+            layout.prop(scene_props, "dds_color_format", expand=True)
         # UV MAP
         row = layout.row()
         row.label(text="UV Map")
         row.prop_search(obj_props, "uv_map",
                         obj.data, "uv_layers", icon='GROUP_UVS', text="")
+        row.prop(obj_props, "use_udim", text="", icon='UV')
 
         # OVERLAY LAYERS
+        layers = obj_props.overlay_layers
         header, panel = layout.panel("ez_bake_overlay_layers",
                                      default_closed=True)
         header = header.row()
         header.prop(obj_props, "use_overlays", text="")
-        header.label(text=f"Overlays ({len(obj_props.overlay_layers)})")
+        header.label(text=f"Overlays ({len(layers)} layers, {sum(len(l.objects) for l in layers)} objects)")
         if panel:
-            if len(obj_props.overlay_layers) == 0:
-                panel.label(text="No layers added")
-            else:
-                for layer_index, layer in enumerate(obj_props.overlay_layers):
-                    layer_row = panel.column(align=True)
-            
-                    layer_header, layer_panel = layer_row.panel(f"ez_bake_overlay_layer[{layer_index}]")
-                    split = layer_header.split(factor = 0.02)
-                    split.separator()
-                    layer_header = split.row(align=True)
-                    layer_header.prop(layer, "enabled", text="")
-                    layer_header.label(text=f"Layer {layer_index} ({len(layer.objects)})")
-                    layer_header.operator("ez_bake.remove_overlay_layer",
-                                 text="", icon='X').index = layer_index
-                    if layer_panel:
-                        if len(layer.objects) == 0:
-                            layer_panel.label(text="No objects added")
-                        else:
-                            for object_index, object in enumerate(layer.objects):
-                                split = layer_panel.split(factor=0.2, align=True)
-                                split.separator()
-                                object_row = split.row(align=True)
-                                object_row.prop(object, "object", text="", expand=True)
-                                op = object_row.operator("ez_bake.remove_overlay_object",
-                                             text="", icon='X')
-                                op.layer_index = layer_index
-                                op.object_index = object_index
-
-                        panel.operator("ez_bake.add_overlay_object", icon='ADD').layer_index = layer_index
-
-
-            panel.operator("ez_bake.add_overlay_layer", icon='ADD')
+            row = panel.row()
+            row.template_list("EZBAKE_UL_overlay_layers", "", obj_props, "overlay_layers",
+                              obj_props, "active_layer_index", rows=3)
+            col = row.column(align=True)
+            col.operator("ez_bake.add_overlay_layer", icon='ADD', text="")
+            col.operator("ez_bake.remove_overlay_layer", icon='REMOVE', text="").index = obj_props.active_layer_index
+
+            if 0 <= obj_props.active_layer_index < len(layers):
+                layer_index = obj_props.active_layer_index
+                layer = layers[layer_index]
+
+                panel.label(text=f"{get_layer_name(layer, layer_index)} objects")
+                row = panel.row()
+                row.template_list("EZBAKE_UL_overlay_objects", "", layer, "objects",
+                                  layer, "active_object_index", rows=4)
+                col = row.column(align=True)
+                col.operator("ez_bake.add_overlay_object", icon='ADD', text="").layer_index = layer_index
+                op = col.operator("ez_bake.remove_overlay_object", icon='REMOVE', text="")
+                op.layer_index = layer_index
+                op.object_index = layer.active_object_index
+
+        # COLLECTION BATCH
+        collection = context.collection
+        collection_props = collection.ez_bake_collection_props
+        batch = utils.get_batch_collections(context.scene)
+        header, panel = layout.panel("ez_bake_batch", default_closed=True)
+        header.label(text=f"Collection Batch ({len(batch)} collections)")
+        if panel:
+            row = panel.row()
+            row.prop(collection_props, "use_batch", text=f"Bake {collection.name}")
+            row.prop(collection_props, "use_preset")
+            if collection_props.use_preset:
+                preset = collection_props.preset
+                col = panel.column()
+                col.active = collection_props.use_batch
+                row = col.row()
+                row.prop(preset, "resolution", text="")
+                row.prop(preset, "samples")
+                row.prop(preset, "use_denoise", text="", icon='SHADERFX')
+                row = col.row()
+                row.prop(preset, "uv_map", text="", icon='GROUP_UVS')
+                row.prop(preset, "use_udim", text="", icon='UV')
+                grid = col.grid_flow(columns=2, row_major=True)
+                for map_name, map_type, non_color in utils.MAPS:
+                    grid.prop(preset, f'bake_{map_name.lower()}')
+            row = panel.row()
+            row.enabled = len(batch) > 0 and not background.is_running()
+            row.operator("object.ez_bake", text="Bake Collections", icon='OUTLINER_COLLECTION').use_collections = True
 
         layout.separator(type='LINE')
         layout.prop(scene_props, "pack_orm")
         layout.prop(scene_props, "pack_alpha")
+        row = layout.row()
+        row.prop(scene_props, "generate_lods")
+        sub = row.row()
+        sub.active = scene_props.generate_lods
+        sub.prop(scene_props, "lod_count", text="Levels")
 
 
 def register():
+    bpy.utils.register_class(EZBAKE_UL_overlay_layers)
+    bpy.utils.register_class(EZBAKE_UL_overlay_objects)
     bpy.utils.register_class(OBJECT_PT_ez_bake)
 
 
 def unregister():
+    bpy.utils.unregister_class(EZBAKE_UL_overlay_layers)
+    bpy.utils.unregister_class(EZBAKE_UL_overlay_objects)
     bpy.utils.unregister_class(OBJECT_PT_ez_bake)
@@ -0,0 +1,39 @@
+import numpy as np
+
+# Working precision of the buffers used to composite and pack baked maps.
+# Outputs are 8 bit, so color data fits in bytes without losing anything. Linear data keeps
+# half floats and normals full floats, results stay within one 8 bit step of a float64 pipeline.
+# Kept free of bpy like lod and dds.
+
+MAP_PRECISION = {
+    "Color": np.uint8,
+    "Emission": np.uint8,
+    "Alpha": np.uint8,
+    "Roughness": np.float16,
+    "Metallic": np.float16,
+    "AO": np.float16,
+    "ORM": np.float16,
+    "Normal": np.float32,
+}
+
+
+def get_dtype(map_name):
+    return np.dtype(MAP_PRECISION.get(map_name, np.float32))
+
+
+# Float pixels in [0, 1] to the compact type, bytes are rounded to the nearest step
+def encode(pixels, dtype):
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        values = np.clip(pixels, 0.0, 1.0) * 255.0
+        return np.rint(values, out=values).astype(np.uint8)
+    return pixels.astype(dtype, copy=False)
+
+
+# Compact pixels back to float32 for math or Blender
+def decode(pixels):
+    if pixels.dtype == np.uint8:
+        values = pixels.astype(np.float32)
+        values *= np.float32(1.0 / 255.0)
+        return values
+    return pixels.astype(np.float32, copy=False)
@@ -1,5 +1,19 @@
 import bpy
 
+
+# Fastest Cycles settings for one resolution band, found by the auto-tune operator
+class EzBakeTunedSettings(bpy.types.PropertyGroup):
+    resolution: bpy.props.IntProperty()
+    # 0 = automatic
+    threads: bpy.props.IntProperty(min=0)
+    # 0 = no tiling
+    tile_size: bpy.props.IntProperty(min=0)
+    use_spatial_splits: bpy.props.BoolProperty()
+    use_persistent_data: bpy.props.BoolProperty()
+    # Calibration bake time
+    seconds: bpy.props.FloatProperty()
+
+
 class EzBakePreferences(bpy.types.AddonPreferences):
     bl_idname = __package__
 
@@ -12,6 +26,29 @@ class EzBakePreferences(bpy.types.AddonPreferences):
         subtype='DIR_PATH',
         default="Textures",
     )
+    scratch_directory: bpy.props.StringProperty(
+        name="Scratch directory",
+        description="Where intermediate overlay buffers are kept while baking, system temp directory if empty",
+        subtype='DIR_PATH',
+        default="",
+    )
+    texel_density: bpy.props.FloatProperty(
+        name="Texel Density",
+        description="Texels per meter objects with automatic resolution are baked at",
+        default=1024.0, min=1.0, soft_max=8192.0
+    )
+    use_tuned_settings: bpy.props.BoolProperty(
+        name="Use Tuned Settings",
+        description="Apply the auto-tuned threads, tile size and acceleration structure settings to CPU bakes",
+        default=True
+    )
+    tuned_settings: bpy.props.CollectionProperty(type=EzBakeTunedSettings)
+    use_profiling: bpy.props.BoolProperty(
+        name="Profile Bakes",
+        description="Profile the Python side of every bake with cProfile and tracemalloc, "
+                    "reports are written to the ez_bake/profiles config directory",
+        default=False
+    )
 
     def draw(self, context):
         layout = self.layout
@@ -19,9 +56,30 @@ class EzBakePreferences(bpy.types.AddonPreferences):
         row = layout.row()
         row.prop(self, "texture_directory")
         row.active = not self.pack_textures
+        layout.prop(self, "scratch_directory")
+        layout.prop(self, "texel_density")
+        layout.prop(self, "use_profiling")
+
+        box = layout.box()
+        row = box.row()
+        row.prop(self, "use_tuned_settings")
+        row.operator("object.ez_bake_autotune", icon='PREFERENCES')
+        if len(self.tuned_settings) == 0:
+            box.label(text="Not tuned yet, bakes use the scene's render settings")
+        for tuned in self.tuned_settings:
+            threads = tuned.threads if tuned.threads > 0 else "auto"
+            tiles = f"tiles {tuned.tile_size}" if tuned.tile_size > 0 else "no tiling"
+            options = [f"{threads} threads", tiles]
+            if tuned.use_spatial_splits:
+                options.append("spatial splits")
+            if tuned.use_persistent_data:
+                options.append("persistent data")
+            box.label(text=f"{tuned.resolution}: {', '.join(options)} ({tuned.seconds:.1f}s)")
 
 def register():
+    bpy.utils.register_class(EzBakeTunedSettings)
     bpy.utils.register_class(EzBakePreferences)
 
 def unregister():
     bpy.utils.unregister_class(EzBakePreferences)
+    bpy.utils.unregister_class(EzBakeTunedSettings)
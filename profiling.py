@@ -0,0 +1,122 @@
+import collections
+import contextlib
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import bpy
+
+# Optional profiling of the Python side of the bake pipeline (material rewiring, overlay setup,
+# pixel processing, saving). Every run writes to the profiles directory:
+#   <run>.prof    cProfile stats of the profiled sections (snakeviz, pstats)
+#   <run>.txt     top allocation sites from tracemalloc
+#   <run>.folded  collapsed stacks sampled from the main thread (flamegraph.pl, speedscope)
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+# Allocation sites listed in the report
+TOP_ALLOCATIONS = 30
+
+_run = None
+
+
+def get_profiles_directory():
+    return bpy.utils.user_resource('CONFIG', path=os.path.join("ez_bake", "profiles"), create=True)
+
+
+def is_enabled(context):
+    return context.preferences.addons[__package__].preferences.use_profiling
+
+
+class ProfileRun:
+    def __init__(self):
+        self.name = time.strftime("%Y%m%d-%H%M%S")
+        self.profiler = cProfile.Profile()
+        self.stacks = collections.Counter()
+        # Nesting depth of profiled sections, stacks are only sampled inside one
+        self.depth = 0
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+
+        tracemalloc.start()
+        self.sampler.start()
+
+    def sample(self):
+        thread_id = threading.main_thread().ident
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            if self.depth == 0:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def finish(self):
+        self.stopped.set()
+        self.sampler.join()
+
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        path = os.path.join(get_profiles_directory(), self.name)
+        self.profiler.dump_stats(path + ".prof")
+
+        with open(path + ".txt", "w") as file:
+            file.write(f"Top {TOP_ALLOCATIONS} allocation sites still alive at the end of the run\n")
+            for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                file.write(f"{statistic}\n")
+
+        with open(path + ".folded", "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+        print(f"[EZBake]: Wrote profile {path}.prof")
+
+
+def start_run(context):
+    global _run
+    if _run is None and is_enabled(context):
+        _run = ProfileRun()
+
+
+def finish_run():
+    global _run
+    if _run is not None:
+        run, _run = _run, None
+        run.finish()
+
+
+# Profile the enclosed code when a run is being profiled, also works as a function decorator
+@contextlib.contextmanager
+def section():
+    if _run is None:
+        yield
+        return
+
+    run = _run
+    run.depth += 1
+    if run.depth == 1:
+        run.profiler.enable()
+    try:
+        yield
+    finally:
+        run.depth -= 1
+        if run.depth == 0:
+            run.profiler.disable()
+
+
+# Operator execute methods, keeps the (self, context) signature Blender checks on registration
+def profile_execute(execute):
+    @functools.wraps(execute)
+    def wrapper(self, context):
+        with section():
+            return execute(self, context)
+    return wrapper
@@ -13,6 +13,7 @@ class EzBakeObjectProps(bpy.types.PropertyGroup):
             ('2048', "2048", "2048 x 2048"),
             ('4096', "4096", "4096 x 4096"),
             ('8192', "8192", "8192 x 8192"),
+            ('AUTO', "Auto", "Smallest power of two reaching the texel density set in the preferences"),
         ],
         default='2048'
     )
@@ -21,9 +22,18 @@ class EzBakeObjectProps(bpy.types.PropertyGroup):
         name="Samples",
         description="""Number of samples to use for baking. Lower=Faster, Higher=Less noise""",
         default=8, min=1)
+    use_denoise: bpy.props.BoolProperty(
+        name="Denoise",
+        description="Denoise the Color and Emission maps after baking, allowing much lower sample counts",
+        default=False)
 
     uv_map: bpy.props.StringProperty(
         name="UV Map", description="UV map to use for baking", default="UVMap")
+    use_udim: bpy.props.BoolProperty(
+        name="UDIM",
+        description="Bake every UDIM tile the UV map uses into its own set of images at the chosen resolution, "
+                    "named {map}.{tile}",
+        default=False)
 
     bake_color: bpy.props.BoolProperty(
         name="Color", description="Bake the color map", default=True)
@@ -33,17 +43,50 @@ class EzBakeObjectProps(bpy.types.PropertyGroup):
         name="Metallic", description="Bake the metallic map", default=True)
     bake_normal: bpy.props.BoolProperty(
         name="Normal", description="Bake the normal map", default=True)
+    bake_ao: bpy.props.BoolProperty(
+        name="AO", description="Bake ambient occlusion at a reduced resolution, upsampled along the normal map",
+        default=False)
+    ao_scale: bpy.props.EnumProperty(
+        name="AO Resolution",
+        description="Resolution the AO map is baked at, relative to the object's resolution",
+        items=[
+            ('1', "Full", "Bake AO at the object's resolution"),
+            ('2', "1/2", "Bake AO at half the object's resolution"),
+            ('4', "1/4", "Bake AO at a quarter of the object's resolution"),
+            ('8', "1/8", "Bake AO at an eighth of the object's resolution"),
+        ],
+        default='4')
+    ao_samples: bpy.props.IntProperty(
+        name="AO Samples", description="Number of samples to use for baking the AO map", default=8, min=1)
     bake_emission: bpy.props.BoolProperty(
         name="Emission", description="Bake the emission map", default=False)
     bake_alpha: bpy.props.BoolProperty(
         name="Alpha", description="Bake the alpha map", default=False)
 
+    # Object whose bake this object shares, set when baking
+    baked_as: bpy.props.StringProperty(
+        name="Baked As", description="Object whose baked images this object uses", default="")
+
     use_overlays: bpy.props.BoolProperty(
         name="Use overlays", default=False)
     overlay_layers: bpy.props.CollectionProperty(
         type=overlay_objects.EzBakeOverlayLayer)
+    active_layer_index: bpy.props.IntProperty(name="Active Layer", default=0)
+
+
 
 
+# Batch baking of whole collections, see OBJECT_OT_ez_bake.use_collections
+class EzBakeCollectionProps(bpy.types.PropertyGroup):
+    use_batch: bpy.props.BoolProperty(
+        name="Batch Bake",
+        description="Bake every mesh object in this collection and its children with Bake Collections",
+        default=False)
+    use_preset: bpy.props.BoolProperty(
+        name="Preset",
+        description="Give the collection's objects these settings when batch baking, overlays stay per object",
+        default=False)
+    preset: bpy.props.PointerProperty(type=EzBakeObjectProps)
 
 
 class EzBakeSceneProps(bpy.types.PropertyGroup):
@@ -51,9 +94,16 @@ class EzBakeSceneProps(bpy.types.PropertyGroup):
     file_format: bpy.props.EnumProperty(
         items=[
             ('JPG', 'JPG', 'JPG File format'),
-            ('PNG', 'PNG', 'PNG File format')],
+            ('PNG', 'PNG', 'PNG File format'),
+            ('DDS', 'DDS', 'Block compressed DDS with mipmaps, ready to be uploaded to the GPU')],
         name="File format", description="File format to use for the baked texture",
         default='JPG')
+    dds_color_format: bpy.props.EnumProperty(
+        items=[
+            ('BC7', 'BC7', 'Highest quality, 8 bits per texel'),
+            ('BC1', 'BC1/BC3', 'Smaller, BC1 (4 bits per texel) or BC3 when the map has alpha')],
+        name="Color compression", description="Block compression used for Color and ORM maps in DDS files",
+        default='BC7')
     pack_orm: bpy.props.BoolProperty(
         name="Pack ORM Map",
         description="Automatically pack AO, Roughness and Metallic into a single image",
@@ -62,18 +112,66 @@ class EzBakeSceneProps(bpy.types.PropertyGroup):
         name="Pack Alpha",
         description="Automatically pack Alpha information into the color image",
         default=False)
+    generate_lods: bpy.props.BoolProperty(
+        name="Generate LODs",
+        description="Downsample every baked map into lower resolution texture sets, named {map}_{resolution}",
+        default=False)
+    lod_count: bpy.props.IntProperty(
+        name="LOD Levels",
+        description="Number of lower resolution sets to generate, each half the size of the previous one",
+        default=3, min=1, max=6)
+    resume_bake: bpy.props.BoolProperty(
+        name="Resume",
+        description="Skip maps already baked by a previous, interrupted run whose output is unchanged on disk",
+        default=False)
+    use_preview: bpy.props.BoolProperty(
+        name="Preview First",
+        description="Bake every map at a low resolution with 1 sample and set up the material before the full bake, "
+                    "which then replaces the preview images",
+        default=False)
+    preview_resolution: bpy.props.IntProperty(
+        name="Preview Resolution",
+        default=256, min=32, max=1024)
+    use_background: bpy.props.BoolProperty(
+        name="Background",
+        description="Bake a snapshot of the file in a separate Blender process and load the images as they finish, "
+                    "this session stays usable and untouched",
+        default=False)
+    background_workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Background Blender processes baking objects and UDIM tiles in parallel, "
+                    "each one gets an equal share of the CPU threads",
+        default=1, min=1, max=16)
+    rebake_changed: bpy.props.BoolProperty(
+        name="Changed Materials Only",
+        description="Re-bake only the faces of materials edited since the last bake and merge them into the "
+                    "existing images, objects with overlays are re-baked in full",
+        default=False)
+    order_by_estimate: bpy.props.BoolProperty(
+        name="Shortest First",
+        description="Bake the objects with the shortest estimated bake time first",
+        default=False)
 
 
 def register():
     bpy.utils.register_class(EzBakeObjectProps)
+    bpy.utils.register_class(EzBakeCollectionProps)
     bpy.utils.register_class(EzBakeSceneProps)
 
     bpy.types.Object.ez_bake_object_props = bpy.props.PointerProperty(
         type=EzBakeObjectProps)
+    bpy.types.Collection.ez_bake_collection_props = bpy.props.PointerProperty(
+        type=EzBakeCollectionProps)
     bpy.types.Scene.ez_bake_scene_props = bpy.props.PointerProperty(
         type=EzBakeSceneProps)
 
 
+# Reverse order, the collection settings point at the object settings
 def unregister():
-    bpy.utils.unregister_class(EzBakeObjectProps)
+    del bpy.types.Scene.ez_bake_scene_props
+    del bpy.types.Collection.ez_bake_collection_props
+    del bpy.types.Object.ez_bake_object_props
+
     bpy.utils.unregister_class(EzBakeSceneProps)
+    bpy.utils.unregister_class(EzBakeCollectionProps)
+    bpy.utils.unregister_class(EzBakeObjectProps)
@@ -0,0 +1,271 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+
+# Throughput report of every bake run and a regression gate over the run history.
+# The bake steps report their time (split into Cycles, Python and file I/O), the texels they
+# delivered, bytes written and cache hits. At the end of a run one JSON summary line is appended
+# to {blend}.ezbake_runs.jsonl next to the .blend. Runs with the same job key (objects, settings and
+# the maps they actually baked) are compared against the median of the runs before them, from the
+# directory holding the add-on folder (inside it operator.py shadows the standard library module):
+#   python -m EZBake.report Scene.ezbake_runs.jsonl --window 5 --tolerance 0.1
+# Kept free of bpy so the history can be checked outside Blender, e.g. in CI after an upgrade.
+# Runs which baked nothing (e.g. a resume finding every map done) are never compared.
+
+# Previous runs of the same job the baseline is the median of
+BASELINE_WINDOW = 5
+# Fraction a run may be slower than the baseline before it is flagged
+REGRESSION_TOLERANCE = 0.1
+
+_run = None
+
+
+class RunReport:
+    def __init__(self, history_path, description, meta):
+        self.history_path = history_path
+        # Settings of the run, hashed into the job key with the maps baked
+        self.description = description
+        self.meta = meta
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        # {map name: {"maps", "texels", "cycles", "steps", "io", "bytes"}}
+        self.maps = {}
+        # {cache name: [hits, misses]}
+        self.cache = {}
+        # (object, map) of every final map baked, after the journal skipped finished ones
+        self.baked = set()
+        # End of the last setup step, the bake runs from there to the next post step
+        self.bake_start = None
+
+    def get_map(self, map_name):
+        return self.maps.setdefault(map_name, {"maps": 0, "texels": 0, "cycles": 0.0, "steps": 0.0,
+                                               "io": 0.0, "bytes": 0})
+
+    def get_summary(self):
+        seconds = time.perf_counter() - self.start_counter
+        per_map = {}
+        for map_name, values in sorted(self.maps.items()):
+            python = max(values["steps"] - values["io"], 0.0)
+            busy = values["cycles"] + values["steps"]
+            per_map[map_name] = {
+                "maps": values["maps"],
+                "texels": values["texels"],
+                "texels_per_second": values["texels"] / busy if busy > 0 else 0.0,
+                "cycles_seconds": values["cycles"],
+                "python_seconds": python,
+                "io_seconds": values["io"],
+                "bytes_written": values["bytes"],
+            }
+
+        maps = sum(v["maps"] for v in per_map.values())
+        texels = sum(v["texels"] for v in per_map.values())
+        return {
+            "job": get_job_key(dict(self.description, baked=sorted(self.baked))),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.start_time)),
+            "meta": self.meta,
+            "seconds": seconds,
+            "maps": maps,
+            "texels": texels,
+            "maps_per_second": maps / seconds if seconds > 0 else 0.0,
+            "texels_per_second": texels / seconds if seconds > 0 else 0.0,
+            "cycles_seconds": sum(v["cycles_seconds"] for v in per_map.values()),
+            "python_seconds": sum(v["python_seconds"] for v in per_map.values()),
+            "io_seconds": sum(v["io_seconds"] for v in per_map.values()),
+            "bytes_written": sum(v["bytes_written"] for v in per_map.values()),
+            "per_map": per_map,
+            "cache": {name: {"hits": hits, "misses": misses,
+                             "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.0}
+                      for name, (hits, misses) in sorted(self.cache.items())},
+        }
+
+
+# Short key of everything that defines the work of a run, JSON serializable description
+def get_job_key(description):
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def start_run(history_path, description, meta):
+    global _run
+    _run = RunReport(history_path, description, meta)
+
+
+# Summary of the finished run, appended to the history and compared with the runs before it
+def finish_run():
+    global _run
+    if _run is None:
+        return None
+    run, _run = _run, None
+
+    summary = run.get_summary()
+    print(f"[EZBake]: {summary['maps']} maps in {summary['seconds']:.1f}s, "
+          f"{summary['maps_per_second']:.2f} maps/s, {summary['texels_per_second'] / 1e6:.2f} Mtexels/s "
+          f"(Cycles {summary['cycles_seconds']:.1f}s, Python {summary['python_seconds']:.1f}s, "
+          f"I/O {summary['io_seconds']:.1f}s, {summary['bytes_written'] / 1e6:.1f} MB written)")
+
+    if run.history_path is not None:
+        history = load_history(run.history_path)
+        append_history(run.history_path, summary)
+        result = compare_run(summary, [r for r in history if r["job"] == summary["job"]])
+        if result is not None and result["flagged"]:
+            print(f"[EZBake]: {format_result(result)}")
+    return summary
+
+
+# Cancelled runs would skew the baseline
+def discard_run():
+    global _run
+    _run = None
+
+
+# target is the object (and UDIM tile) the map was baked for
+def add_map(target, map_name, texels, is_final):
+    if _run is not None and is_final:
+        values = _run.get_map(map_name)
+        values["texels"] += texels
+        values["maps"] += 1
+        _run.baked.add((target, map_name))
+
+
+def add_io(map_name, seconds, written):
+    if _run is not None:
+        values = _run.get_map(map_name)
+        values["io"] += seconds
+        values["bytes"] += written
+
+
+def count_cache(name, hit):
+    if _run is not None:
+        counts = _run.cache.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+# Bake step execute methods ("setup" or "post"), their time is the Python overhead of the map and
+# the time between a setup and the following post step is the Cycles bake
+def time_step(kind):
+    def decorator(execute):
+        @functools.wraps(execute)
+        def wrapper(self, context):
+            if _run is None:
+                return execute(self, context)
+
+            start = time.perf_counter()
+            values = _run.get_map(self.map_name)
+            if kind == "post" and _run.bake_start is not None:
+                values["cycles"] += start - _run.bake_start
+                _run.bake_start = None
+            try:
+                return execute(self, context)
+            finally:
+                end = time.perf_counter()
+                values["steps"] += end - start
+                if kind == "setup":
+                    _run.bake_start = end
+        return wrapper
+    return decorator
+
+
+def load_history(history_path):
+    runs = []
+    if not os.path.exists(history_path):
+        return runs
+    with open(history_path, "r") as file:
+        for line in file:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return runs
+
+
+def append_history(history_path, summary):
+    with open(history_path, "a") as file:
+        file.write(json.dumps(summary) + "\n")
+
+
+# Compare a run with the median of the previous runs of its job (oldest first), None without any
+# or when the run baked nothing, runs without maps are left out of the baseline as well
+# The per map comparison lists the map types whose texels/s dropped by more than the tolerance
+def compare_run(run, previous, metric="texels_per_second", window=BASELINE_WINDOW, tolerance=REGRESSION_TOLERANCE):
+    previous = [r for r in previous if r["maps"] > 0][-window:]
+    if not previous or run["maps"] == 0:
+        return None
+
+    baseline = statistics.median(r[metric] for r in previous)
+    ratio = run[metric] / baseline if baseline > 0 else 1.0
+
+    slower_maps = []
+    for map_name, values in run["per_map"].items():
+        rates = [r["per_map"][map_name]["texels_per_second"] for r in previous if map_name in r["per_map"]]
+        map_baseline = statistics.median(rates) if rates else 0.0
+        if map_baseline > 0 and values["texels_per_second"] < map_baseline * (1.0 - tolerance):
+            slower_maps.append(map_name)
+
+    return {
+        "job": run["job"],
+        "time": run["time"],
+        "metric": metric,
+        "value": run[metric],
+        "baseline": baseline,
+        "ratio": ratio,
+        "runs": len(previous),
+        "slower_maps": slower_maps,
+        "flagged": ratio < 1.0 - tolerance,
+    }
+
+
+# Every run (or only the latest of every job) compared with the runs of its job before it
+def compare_history(runs, metric="texels_per_second", window=BASELINE_WINDOW, tolerance=REGRESSION_TOLERANCE,
+                    latest_only=True):
+    jobs = {}
+    for run in runs:
+        jobs.setdefault(run["job"], []).append(run)
+
+    results = []
+    for job_runs in jobs.values():
+        indices = [len(job_runs) - 1] if latest_only else range(len(job_runs))
+        for index in indices:
+            result = compare_run(job_runs[index], job_runs[:index], metric, window, tolerance)
+            if result is not None:
+                results.append(result)
+    return results
+
+
+def format_result(result):
+    change = (result["ratio"] - 1.0) * 100.0
+    text = f'{result["time"]} job {result["job"]}: {result["metric"]} {result["value"]:.4g} ' \
+           f'({change:+.1f}% against the median {result["baseline"]:.4g} of {result["runs"]} runs)'
+    if result["flagged"]:
+        text = "SLOWER " + text
+    if result["slower_maps"]:
+        text += f', slower maps: {", ".join(result["slower_maps"])}'
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="report", description="Compare bake runs with their rolling baseline")
+    parser.add_argument("history", help="run history, {blend}.ezbake_runs.jsonl")
+    parser.add_argument("--metric", default="texels_per_second", choices=["texels_per_second", "maps_per_second"])
+    parser.add_argument("--window", type=int, default=BASELINE_WINDOW, help="previous runs in the baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="fraction a run may be slower than the baseline")
+    parser.add_argument("--all", action="store_true", help="compare every run, not only the latest of every job")
+    args = parser.parse_args(argv)
+
+    results = compare_history(load_history(args.history), args.metric, args.window, args.tolerance,
+                              latest_only=not args.all)
+    for result in results:
+        print(format_result(result))
+
+    flagged = [r for r in results if r["flagged"]]
+    print(f"{len(flagged)} of {len(results)} compared runs slower than their baseline", file=sys.stderr)
+    # Non-zero exit status fails a pipeline step on a regression
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
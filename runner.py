@@ -0,0 +1,82 @@
+import collections
+import types
+
+import bpy
+from . import utils
+
+# Runs the bake steps of a batch one after another, each inside a context override naming the object
+# it works on, instead of selecting objects like the macro does. The selection, the outliner and the
+# depsgraph aren't touched per object, so batches aren't limited to what can be selected by hand.
+# Steps are recorded with the macro's define() interface, see macro.add_objects.
+
+# Steps the macro needs for selecting objects, the override replaces them
+SELECTION_STEPS = {"OBJECT_OT_ez_bake_select", "OBJECT_OT_ez_bake_restore_selection"}
+
+
+class StepQueue:
+    def __init__(self):
+        self.steps = 0
+        # Estimated seconds for all steps
+        self.estimate = 0.0
+        self.operators = collections.deque()
+        # Object the following steps work on
+        self.object = None
+
+    def define(self, idname):
+        step = types.SimpleNamespace(idname=idname, properties=types.SimpleNamespace())
+        self.operators.append(step)
+        return step
+
+    def is_empty(self):
+        return len(self.operators) == 0
+
+
+def get_operator(idname):
+    category, _, name = idname.partition("_OT_")
+    return getattr(getattr(bpy.ops, category.lower()), name)
+
+
+# Run steps until a bake was started, blocking runs everything in place (headless)
+def advance(context, queue, blocking=False):
+    while not queue.is_empty():
+        # Bakes started with INVOKE_DEFAULT run as a job, the next step waits for it
+        if bpy.app.is_job_running('OBJECT_BAKE'):
+            return
+
+        step = queue.operators.popleft()
+        if step.idname == "OBJECT_OT_ez_bake_select":
+            queue.object = bpy.data.objects.get(step.properties.object_name)
+            continue
+        if step.idname in SELECTION_STEPS:
+            continue
+
+        run(context, queue.object, step, blocking)
+        if step.idname == "OBJECT_OT_bake" and not blocking:
+            return
+
+
+# Drop the steps still queued, the post step of a bake that is running still has to run
+def stop(queue, is_baking):
+    kept = []
+    if is_baking:
+        while not queue.is_empty():
+            step = queue.operators.popleft()
+            kept.append(step)
+            if step.idname == "OBJECT_OT_ez_bake_post":
+                break
+    queue.operators = collections.deque(kept)
+
+
+def run(context, obj, step, blocking=False):
+    # Overlay layers are baked selected to active from their joined copy
+    selected = [obj]
+    overlay_object = context.scene.objects.get(utils.OVERLAY_OBJECT)
+    if overlay_object is not None:
+        selected.insert(0, overlay_object)
+
+    with context.temp_override(object=obj, active_object=obj, selected_objects=selected,
+                               selected_editable_objects=selected):
+        result = get_operator(step.idname)('EXEC_DEFAULT' if blocking else 'INVOKE_DEFAULT',
+                                           **vars(step.properties))
+    if 'CANCELLED' in result:
+        raise Exception(f"{step.idname} was cancelled on {obj.name}")
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+
+import bpy
+import numpy as np
+from . import precision
+
+# Memory-mapped scratch files for intermediate overlay buffers.
+# Layer masks and overlay passes live on disk instead of in Blender images or Python lists,
+# so peak memory doesn't grow with the number of layers and maps. Everything is deleted
+# at the end of the run.
+
+# Texels converted per band when storing compact buffers
+STORE_CHUNK_TEXELS = 1 << 20
+
+_directory = None
+# Open (height, width, 4) buffers by name
+_buffers = {}
+
+
+# Run directory inside the scratch directory from the preferences (system temp if unset)
+def get_directory():
+    global _directory
+    if _directory is None:
+        prefs = bpy.context.preferences.addons[__package__].preferences
+        root = bpy.path.abspath(prefs.scratch_directory) if prefs.scratch_directory else tempfile.gettempdir()
+        os.makedirs(root, exist_ok=True)
+        _directory = tempfile.mkdtemp(prefix="ez_bake_", dir=root)
+    return _directory
+
+
+def get_path(name):
+    return os.path.join(get_directory(), f'{bpy.path.clean_name(name)}.raw')
+
+
+def create(name, shape, dtype=np.float32):
+    remove(name)
+    buffer = np.memmap(get_path(name), dtype=dtype, mode="w+", shape=shape)
+    _buffers[name] = buffer
+    return buffer
+
+
+# Copy the pixels of an image into a scratch file, read straight from the file afterwards
+def store(name, image, dtype=np.float32):
+    width, height = image.size
+    return read_into(image, create(name, (height, width, 4), dtype))
+
+
+# Pixels of an image into a (height, width, 4) buffer of any precision dtype
+# Blender only hands out float32 copies, compact types are converted from it a band of rows at a time
+def read_into(image, out):
+    if out.dtype == np.float32:
+        image.pixels.foreach_get(out.reshape(-1))
+        return out
+
+    height, width = out.shape[:2]
+    pixels = np.empty((height, width, 4), dtype=np.float32)
+    image.pixels.foreach_get(pixels.ravel())
+    rows = max(1, STORE_CHUNK_TEXELS // width)
+    for start in range(0, height, rows):
+        out[start:start + rows] = precision.encode(pixels[start:start + rows], out.dtype)
+    return out
+
+
+# Counterpart of read_into, compact pixels are decoded a band of rows at a time
+def write_from(image, pixels):
+    if pixels.dtype == np.float32:
+        image.pixels.foreach_set(pixels.reshape(-1))
+        return
+
+    width, height = image.size
+    pixels = pixels.reshape(height, width, 4)
+    decoded = np.empty((height, width, 4), dtype=np.float32)
+    rows = max(1, STORE_CHUNK_TEXELS // width)
+    for start in range(0, height, rows):
+        decoded[start:start + rows] = precision.decode(pixels[start:start + rows])
+    image.pixels.foreach_set(decoded.ravel())
+
+
+def get(name):
+    return _buffers.get(name)
+
+
+def remove(name):
+    buffer = _buffers.pop(name, None)
+    if buffer is None:
+        return
+    filename = buffer.filename
+    del buffer
+    try:
+        os.remove(filename)
+    except OSError:
+        # Still mapped somewhere (Windows), removed with the run directory
+        pass
+
+
+def clear():
+    global _directory
+    _buffers.clear()
+    if _directory is not None:
+        shutil.rmtree(_directory, ignore_errors=True)
+        _directory = None
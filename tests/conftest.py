@@ -0,0 +1,36 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The add-on folder is loaded as the EZBake package, like Blender does, without putting it on sys.path
+# (its operator.py would shadow the standard library module). Tests needing Blender are skipped
+# unless bpy is importable, e.g. with the bpy module from PyPI.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "EZBake"
+
+
+def load_package():
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"),
+                                                      submodule_search_locations=[ROOT])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = module
+        spec.loader.exec_module(module)
+    return sys.modules[PACKAGE]
+
+
+load_package()
+
+
+# Registered add-on in a fresh file
+@pytest.fixture
+def addon():
+    bpy = pytest.importorskip("bpy")
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    package = load_package()
+    package.register()
+    yield package
+    package.unregister()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+
+# A smooth gradient has no noise to remove, the denoised image has to come back in the same
+# sRGB encoding with straight alpha
+def test_denoise_keeps_srgb_gradient(addon):
+    bpy = pytest.importorskip("bpy")
+    from EZBake import denoise
+
+    width, height = 64, 16
+    image = bpy.data.images.new("gradient", width=width, height=height, alpha=True)
+    image.colorspace_settings.name = 'sRGB'
+
+    pixels = np.empty((height, width, 4), dtype=np.float32)
+    pixels[..., :3] = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :, None]
+    pixels[..., 3] = 0.5
+    image.pixels.foreach_set(pixels.ravel())
+
+    denoise.denoise_image(image)
+
+    result = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(result)
+    result = result.reshape(height, width, 4)
+
+    # Linear values would be up to 0.5 darker in the midtones, premultiplied ones half as bright
+    assert np.abs(result[..., :3] - pixels[..., :3]).mean() < 2.0 / 255.0
+    assert np.abs(result[..., :3] - pixels[..., :3]).max() < 8.0 / 255.0
@@ -0,0 +1,41 @@
+import pytest
+
+
+# Two objects sharing one mesh and material, placed apart
+def make_instances(bpy):
+    mesh = bpy.data.meshes.new("shared")
+    mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+    mesh.materials.append(bpy.data.materials.new("shared"))
+
+    objects = []
+    for index in range(2):
+        obj = bpy.data.objects.new(f'instance_{index}', mesh)
+        obj.location.x = index * 2
+        bpy.context.scene.collection.objects.link(obj)
+        objects.append(obj)
+    return objects
+
+
+# AO sees the object's surroundings, instances of one mesh can't share its bake
+def test_group_key_is_per_object_with_ao(addon):
+    bpy = pytest.importorskip("bpy")
+    from EZBake import macro
+
+    objects = make_instances(bpy)
+    for obj in objects:
+        obj.ez_bake_object_props.bake_ao = True
+
+    keys = [macro.get_group_key(bpy.context, obj) for obj in objects]
+    assert keys == [obj.name for obj in objects]
+
+
+def test_group_key_is_shared_without_ao(addon):
+    bpy = pytest.importorskip("bpy")
+    from EZBake import macro
+
+    objects = make_instances(bpy)
+    for obj in objects:
+        obj.ez_bake_object_props.bake_ao = False
+
+    first, second = [macro.get_group_key(bpy.context, obj) for obj in objects]
+    assert first == second
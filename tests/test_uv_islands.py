@@ -0,0 +1,79 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from EZBake import uv_islands
+
+
+# Dilation growing every texel of the image on each step, the behaviour the frontier version has to keep
+def reference_dilation(mask, margin):
+    height, width = mask.shape
+    source = np.where(mask, np.arange(height * width).reshape(height, width), -1)
+
+    for _ in range(margin):
+        previous = source.copy()
+        for dy, dx in uv_islands.NEIGHBOURS:
+            shifted = np.full_like(previous, -1)
+            shifted[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+                previous[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+            take = (source < 0) & (shifted >= 0)
+            source[take] = shifted[take]
+
+    margin_texels = np.flatnonzero((source.ravel() >= 0) & ~mask.ravel())
+    return margin_texels, source.ravel()[margin_texels]
+
+
+def test_dilation_matches_reference():
+    rng = np.random.default_rng(0)
+    for margin in (0, 1, 3, 8):
+        mask = rng.random((37, 53)) > 0.97
+        texels, sources = uv_islands.get_dilation_indices(mask, margin)
+        expected_texels, expected_sources = reference_dilation(mask, margin)
+        np.testing.assert_array_equal(texels, expected_texels)
+        np.testing.assert_array_equal(sources, expected_sources)
+
+
+def test_dilation_empty_and_full_masks():
+    for mask in (np.zeros((16, 16), dtype=bool), np.ones((16, 16), dtype=bool)):
+        texels, sources = uv_islands.get_dilation_indices(mask, 4)
+        assert len(texels) == 0 and len(sources) == 0
+
+
+# The cost follows the margin band, a 4K map with a few islands has to dilate well within a second
+def test_dilation_time_follows_band():
+    size = 4096
+    uv_tris = [[(0.1, 0.1), (0.4, 0.1), (0.1, 0.4)], [(0.6, 0.6), (0.9, 0.6), (0.9, 0.9)]]
+    mask = uv_islands.rasterize_triangles(np.array(uv_tris), size, size)
+
+    start = time.perf_counter()
+    texels, sources = uv_islands.get_dilation_indices(mask, 16)
+    elapsed = time.perf_counter() - start
+
+    assert len(texels) > 0 and mask.ravel()[sources].all()
+    assert elapsed < 1.0
+
+
+def test_rasterize_matches_texel_centers():
+    size = 64
+    uv_tris = np.array([[(0.0, 0.0), (1.0, 0.0), (0.0, 1.0)]])
+    mask = uv_islands.rasterize_triangles(uv_tris, size, size)
+
+    y, x = np.mgrid[0:size, 0:size]
+    expected = (x + 0.5) + (y + 0.5) <= size
+    np.testing.assert_array_equal(mask, expected)
+
+
+# One triangle covering a 4K map is tested in blocks, memory stays far below its bounding box grid
+def test_rasterize_large_triangle_bounded_memory():
+    size = 4096
+    uv_tris = np.array([[(0.0, 0.0), (1.0, 0.0), (1.0, 1.0)], [(0.0, 0.0), (1.0, 1.0), (0.0, 1.0)]])
+    mask = np.zeros((size, size), dtype=bool)
+
+    tracemalloc.start()
+    uv_islands.rasterize_triangles(uv_tris, size, size, mask)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert mask.all()
+    assert peak < 128 * 1024 * 1024
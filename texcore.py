@@ -0,0 +1,264 @@
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from . import precision
+
+# Pure NumPy compositing and packing of baked maps, shared by the add-on and the command line.
+# Works on (height, width, 4) arrays in any of the precision dtypes, image files are read and
+# written with Pillow when it is installed. Repack a texture directory without Blender, from the
+# directory holding the add-on folder (inside it operator.py shadows the standard library module):
+#   python -m EZBake.texcore orm Textures --layout ORM
+#   python -m EZBake.texcore alpha Textures
+
+# Texels composited per band when overlaying
+OVERLAY_CHUNK_TEXELS = 1 << 20
+# Texels upsampled per band
+UPSAMPLE_CHUNK_TEXELS = 1 << 18
+# Falloff of the upsampling weights with the difference of the guide (normal map colors)
+UPSAMPLE_RANGE_SIGMA = 0.1
+
+# Neutral value of every packed map when it wasn't baked
+NEUTRAL = {
+    "AO": 1.0,
+    "Roughness": 0.5,
+    "Metallic": 0.0,
+}
+
+# Channel layout letters: source map, inverted
+LAYOUT_CHANNELS = {
+    "O": ("AO", False),
+    "R": ("Roughness", False),
+    "S": ("Roughness", True),
+    "M": ("Metallic", False),
+}
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tga", ".tif", ".tiff")
+
+
+# Overlay decal (layer, masked by the red channel of mask) over base, in place
+# Alpha overlays take the maximum instead of blending. Works a band of rows at a time so
+# memory-mapped buffers are never fully loaded
+def overlay(base, layer, mask, is_alpha=False):
+    height, width = base.shape[:2]
+
+    rows = max(1, OVERLAY_CHUNK_TEXELS // width)
+    for start in range(0, height, rows):
+        band = slice(start, start + rows)
+        pixels_A = precision.decode(base[band]).copy()
+        pixels_B = precision.decode(layer[band])
+        t = precision.decode(mask[band, :, :1])
+
+        if is_alpha:
+            np.maximum(pixels_A[..., :3], pixels_B[..., :3], out=pixels_A[..., :3])
+        else:
+            pixels_A[..., :3] += t * (pixels_B[..., :3] - pixels_A[..., :3])
+
+        np.maximum(pixels_A[..., 3:], t, out=pixels_A[..., 3:])
+        # pixels_A[..., 3:] *= mask[band, :, 3:] # add option in the future
+
+        base[band] = precision.encode(pixels_A, base.dtype)
+
+    return base
+
+
+# Red channel of alpha into the alpha channel of color, in place
+def pack_alpha(color, alpha):
+    color[..., 3] = precision.encode(precision.decode(alpha[..., 0]), color.dtype)
+    return color
+
+
+# Texels of region under the (height, width) mask over base, in place
+def merge(base, region, mask):
+    base[mask] = precision.encode(precision.decode(region[mask]), base.dtype)
+    return base
+
+
+# Joint bilateral upsampling of a (h, w, 4) bake to the (height, width) of guide, a full resolution
+# map of the same surface (the normal bake). Every texel blends its 2x2 bilinear neighbours, weighted
+# by how close their downsampled guide is to its own, so values don't bleed across the creases the
+# guide shows. low_mask (h, w) leaves uncovered texels out, texels without any similar neighbour fall
+# back to plain bilinear weights. Without a guide this is a bilinear resize
+def upsample(low, height, width, guide=None, low_mask=None, dtype=None):
+    dtype = low.dtype if dtype is None else np.dtype(dtype)
+    low_height, low_width, channels = low.shape
+    values = precision.decode(low)
+    coverage = np.ones((low_height, low_width), np.float32) if low_mask is None else low_mask.astype(np.float32)
+    low_guide = None if guide is None else downsample(precision.decode(guide[..., :3]), low_height, low_width)
+
+    # Texel centers in low resolution texel space, their lower left neighbour and bilinear weights
+    x = (np.arange(width) + 0.5) * (low_width / width) - 0.5
+    x_start = np.floor(x).astype(np.int64)
+    weights_x = [(1.0 - (x - x_start)).astype(np.float32), (x - x_start).astype(np.float32)]
+    columns = [np.clip(x_start + dx, 0, low_width - 1) for dx in range(2)]
+
+    result = np.empty((height, width, channels), dtype=dtype)
+    rows = max(1, UPSAMPLE_CHUNK_TEXELS // width)
+    for start in range(0, height, rows):
+        y = (np.arange(start, min(start + rows, height)) + 0.5) * (low_height / height) - 0.5
+        y_start = np.floor(y).astype(np.int64)
+        weights_y = [(1.0 - (y - y_start)).astype(np.float32), (y - y_start).astype(np.float32)]
+        band_guide = None if guide is None else precision.decode(guide[start:start + rows, :, :3])
+
+        total = np.zeros((len(y), width), np.float32)
+        accumulated = np.zeros((len(y), width, channels), np.float32)
+        bilinear_total = np.zeros_like(total)
+        bilinear_accumulated = np.zeros_like(accumulated)
+
+        for dy in range(2):
+            row = np.clip(y_start + dy, 0, low_height - 1)
+            row_values, row_coverage = values[row], coverage[row]
+            row_guide = None if guide is None else low_guide[row]
+            for dx in range(2):
+                sample = row_values[:, columns[dx]]
+                weight = weights_y[dy][:, None] * weights_x[dx][None, :] * row_coverage[:, columns[dx]]
+                bilinear_total += weight
+                bilinear_accumulated += weight[..., None] * sample
+
+                if band_guide is not None:
+                    difference = np.square(band_guide - row_guide[:, columns[dx]]).sum(axis=-1)
+                    weight *= np.exp(difference * (-0.5 / UPSAMPLE_RANGE_SIGMA ** 2))
+                    total += weight
+                    accumulated += weight[..., None] * sample
+
+        band = bilinear_accumulated / np.maximum(bilinear_total, 1e-8)[..., None]
+        if band_guide is not None:
+            edge_aware = total > 1e-4 * bilinear_total
+            band[edge_aware] = accumulated[edge_aware] / total[edge_aware][:, None]
+        result[start:start + rows] = precision.encode(band, dtype)
+
+    return result
+
+
+# Box filtered (height, width) version of a larger (H, W, C) array, nearest texels when the sizes don't divide
+def downsample(values, height, width):
+    full_height, full_width = values.shape[:2]
+    if full_height % height == 0 and full_width % width == 0:
+        return values.reshape(height, full_height // height, width, full_width // width, -1).mean(axis=(1, 3))
+    rows = (np.arange(height) * full_height) // height
+    columns = (np.arange(width) * full_width) // width
+    return values[rows[:, None], columns[None, :]]
+
+
+# Pack single channel maps into one image, layout is 3 or 4 letters of LAYOUT_CHANNELS
+# (or 0/1 for constants), a 3 letter layout gets an opaque alpha
+# maps is {"AO": pixels, "Roughness": pixels, "Metallic": pixels}, missing maps are neutral
+def combine_orm(maps, shape, layout="ORM", dtype=None):
+    dtype = precision.get_dtype("ORM") if dtype is None else np.dtype(dtype)
+    result = np.empty(tuple(shape[:2]) + (4,), dtype=dtype)
+    result[..., 3] = precision.encode(np.float32(1.0), dtype)
+
+    for channel, letter in enumerate(layout):
+        if letter in "01":
+            values = np.float32(letter)
+        else:
+            map_name, invert = LAYOUT_CHANNELS[letter]
+            pixels = maps.get(map_name)
+            values = np.float32(NEUTRAL[map_name]) if pixels is None else precision.decode(pixels[..., 0])
+            if invert:
+                values = 1.0 - values
+        result[..., channel] = precision.encode(values, dtype)
+
+    return result
+
+
+def get_image_module():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Exception("Reading and writing image files needs Pillow (pip install pillow)")
+    return Image
+
+
+# (height, width, 4) uint8 pixels of an image file, top row first
+def read_image(filepath):
+    Image = get_image_module()
+    with Image.open(filepath) as image:
+        return np.asarray(image.convert("RGBA"), dtype=np.uint8).copy()
+
+
+def write_image(filepath, pixels, keep_alpha=True):
+    Image = get_image_module()
+    pixels = precision.encode(precision.decode(pixels), np.uint8)
+    image = Image.fromarray(pixels if keep_alpha else pixels[..., :3].copy())
+    if os.path.splitext(filepath)[1].lower() in (".jpg", ".jpeg"):
+        image = image.convert("RGB")
+    image.save(filepath)
+
+
+# Baked maps in a directory grouped by texture set, {(name, tile): {map_name: path}}
+# LOD sets ({name}_{map}_{size}) and UDIM tiles ({name}_{map}.{tile}) are grouped on their own,
+# tile is ".{tile}" or "" for regular maps
+def find_texture_sets(directory, map_names):
+    pattern = re.compile(rf'^(.+)_({"|".join(map_names)})(_\d+)?(\.\d{{4}})?$')
+    sets = {}
+    for filename in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(filename)
+        match = pattern.match(stem)
+        if extension.lower() not in IMAGE_EXTENSIONS or match is None:
+            continue
+        key = (match.group(1) + (match.group(3) or ""), match.group(4) or "")
+        sets.setdefault(key, {})[match.group(2)] = os.path.join(directory, filename)
+    return sets
+
+
+def repack_orm(name, tile, paths, output_directory, layout, suffix, extension):
+    maps = {map_name: read_image(path) for map_name, path in paths.items()}
+    shape = next(iter(maps.values())).shape
+    filepath = os.path.join(output_directory, f'{name}{suffix}{tile}{extension}')
+    write_image(filepath, combine_orm(maps, shape, layout), keep_alpha=len(layout) == 4)
+    return filepath
+
+
+def repack_alpha(name, tile, paths, output_directory, extension):
+    color = pack_alpha(read_image(paths["Color"]), read_image(paths["Alpha"]))
+    filepath = os.path.join(output_directory, f'{name}_Color{tile}{extension}')
+    write_image(filepath, color)
+    return filepath
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="texcore", description="Repack baked texture directories")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    orm_parser = subparsers.add_parser("orm", help="pack AO, Roughness and Metallic maps into one image")
+    orm_parser.add_argument("--layout", default="ORM",
+                            help="channel letters: O=AO, R=Roughness, S=1-Roughness, M=Metallic, 0/1=constant")
+    orm_parser.add_argument("--suffix", default="_ORM")
+
+    subparsers.add_parser("alpha", help="pack Alpha maps into the alpha channel of Color maps (PNG)")
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("directory")
+        subparser.add_argument("--output", help="output directory, defaults to the input directory")
+        subparser.add_argument("--format", default=".png", help="output file extension")
+        subparser.add_argument("--workers", type=int, default=None, help="worker processes")
+
+    args = parser.parse_args(argv)
+    output_directory = args.output or args.directory
+    os.makedirs(output_directory, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.command == "orm":
+            layout = args.layout.upper()
+            if len(layout) not in (3, 4) or any(c not in LAYOUT_CHANNELS and c not in "01" for c in layout):
+                parser.error(f"invalid layout {args.layout}")
+            sets = find_texture_sets(args.directory, list(NEUTRAL))
+            futures = [pool.submit(repack_orm, name, tile, paths, output_directory, layout, args.suffix, args.format)
+                       for (name, tile), paths in sets.items()]
+        else:
+            sets = find_texture_sets(args.directory, ["Color", "Alpha"])
+            futures = [pool.submit(repack_alpha, name, tile, paths, output_directory, args.format)
+                       for (name, tile), paths in sets.items() if {"Color", "Alpha"} <= paths.keys()]
+
+        for future in futures:
+            print(future.result())
+
+    print(f"{len(futures)} texture sets written", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import math
+import os
+import time
+
+import bpy
+import bmesh
+
+# Cycles performance settings for baking, tuned per resolution band on the current machine.
+# The defaults suit final renders, bakes of 512-8192 textures often run faster with other
+# tile sizes, thread counts and acceleration structure options.
+
+# Scene settings changed while baking, restored afterwards
+BAKE_SETTINGS = [
+    "render.engine",
+    "cycles.samples",
+    "cycles.use_denoising",
+    "render.bake.use_pass_direct",
+    "render.bake.use_pass_indirect",
+    "render.bake.use_selected_to_active",
+    "render.bake.use_clear",
+    "render.bake.margin",
+    "render.threads_mode",
+    "render.threads",
+    "cycles.use_auto_tile",
+    "cycles.tile_size",
+    "cycles.debug_use_spatial_splits",
+    "render.use_persistent_data",
+]
+
+RESOLUTIONS = [512, 1024, 2048, 4096, 8192]
+
+# Samples used by the calibration bakes, enough for sampling to dominate setup overhead
+CALIBRATION_SAMPLES = 4
+
+
+def get_setting(scene, path):
+    owner, _, name = path.rpartition(".")
+    return getattr(scene.path_resolve(owner), name)
+
+
+def set_setting(scene, path, value):
+    owner, _, name = path.rpartition(".")
+    setattr(scene.path_resolve(owner), name, value)
+
+
+def snapshot(scene, paths=BAKE_SETTINGS):
+    return {path: get_setting(scene, path) for path in paths}
+
+
+def restore(scene, settings):
+    for path, value in settings.items():
+        set_setting(scene, path, value)
+
+
+# Tuned settings of the band closest to the resolution, None if the machine wasn't tuned
+def get_tuned(context, resolution):
+    prefs = context.preferences.addons[__package__].preferences
+    if not prefs.use_tuned_settings or len(prefs.tuned_settings) == 0:
+        return None
+    return min(prefs.tuned_settings, key=lambda t: abs(math.log2(t.resolution) - math.log2(resolution)))
+
+
+def get_scene_settings(threads, tile_size, use_spatial_splits, use_persistent_data):
+    return {
+        "render.threads_mode": 'FIXED' if threads > 0 else 'AUTO',
+        "render.threads": max(threads, 1),
+        "cycles.use_auto_tile": tile_size > 0,
+        "cycles.tile_size": max(tile_size, 8),
+        "cycles.debug_use_spatial_splits": use_spatial_splits,
+        "render.use_persistent_data": use_persistent_data,
+    }
+
+
+# Settings were tuned on the CPU, GPU bakes keep the scene's own
+def apply(context, resolution):
+    scene = context.scene
+    tuned = get_tuned(context, resolution)
+    if tuned is None or scene.cycles.device != 'CPU':
+        return
+
+    restore(scene, get_scene_settings(tuned.threads, tuned.tile_size, tuned.use_spatial_splits,
+                                      tuned.use_persistent_data))
+
+
+class OBJECT_OT_ez_bake_autotune(bpy.types.Operator):
+    bl_idname = "object.ez_bake_autotune"
+    bl_label = "Auto-tune Bake Performance"
+    bl_description = "Run short calibration bakes on the CPU and store the fastest settings for every resolution"
+    bl_options = {"REGISTER"}
+
+    max_resolution: bpy.props.EnumProperty(
+        name="Up to",
+        items=[(str(r), str(r), f"Calibrate resolutions up to {r} x {r}") for r in RESOLUTIONS],
+        default='4096',
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        prefs = context.preferences.addons[__package__].preferences
+        scene = context.scene
+        resolutions = [r for r in RESOLUTIONS if r <= int(self.max_resolution)]
+
+        settings = snapshot(scene, BAKE_SETTINGS + ["cycles.device"])
+        selected = list(context.selected_objects)
+        active = context.view_layer.objects.active
+        obj, image = self.create_calibration_object(context)
+
+        try:
+            scene.render.engine = 'CYCLES'
+            scene.cycles.device = 'CPU'
+            scene.cycles.samples = CALIBRATION_SAMPLES
+            scene.cycles.use_denoising = False
+
+            prefs.tuned_settings.clear()
+            for resolution in resolutions:
+                self.tune(context, prefs.tuned_settings.add(), resolution, image)
+        finally:
+            mesh = obj.data
+            material = mesh.materials[0]
+            bpy.data.objects.remove(obj)
+            bpy.data.meshes.remove(mesh)
+            bpy.data.materials.remove(material)
+            bpy.data.images.remove(image)
+            restore(scene, settings)
+
+            for o in selected:
+                o.select_set(True)
+            context.view_layer.objects.active = active
+
+        self.report({"INFO"}, f"Tuned bake settings for {len(resolutions)} resolutions")
+        return {"FINISHED"}
+
+    # Coordinate descent over one setting at a time, starting from the scene defaults
+    def tune(self, context, tuned, resolution, image):
+        image.scale(resolution, resolution)
+
+        cpu_count = os.cpu_count() or 1
+        current = {
+            "threads": 0,
+            "tile_size": 2048,
+            "use_spatial_splits": False,
+            "use_persistent_data": False,
+        }
+        candidates = {
+            "threads": sorted({0, max(cpu_count // 2, 1)}),
+            "tile_size": [0] + [t for t in (256, 512, 1024, 2048) if t < resolution],
+            "use_spatial_splits": [False, True],
+            "use_persistent_data": [False, True],
+        }
+
+        best_seconds = None
+        for name, values in candidates.items():
+            best_value = current[name]
+            for value in values:
+                seconds = self.measure(context, {**current, name: value})
+                if best_seconds is None or seconds < best_seconds:
+                    best_seconds, best_value = seconds, value
+            current[name] = best_value
+
+        tuned.resolution = resolution
+        tuned.threads = current["threads"]
+        tuned.tile_size = current["tile_size"]
+        tuned.use_spatial_splits = current["use_spatial_splits"]
+        tuned.use_persistent_data = current["use_persistent_data"]
+        tuned.seconds = best_seconds
+        print(f"[EZBake]: Tuned {resolution}: {current}, {best_seconds:.2f}s")
+
+    # Two consecutive bakes of the selected calibration object, so persistent data gets the chance to pay off
+    def measure(self, context, candidate):
+        restore(context.scene, get_scene_settings(**candidate))
+
+        start = time.perf_counter()
+        for _ in range(2):
+            bpy.ops.object.bake(type='DIFFUSE', pass_filter={'COLOR'}, margin=0, use_clear=True,
+                                use_selected_to_active=False, save_mode='INTERNAL')
+        return time.perf_counter() - start
+
+    # Textured UV sphere, baked into an image of the band's resolution
+    def create_calibration_object(self, context):
+        mesh = bpy.data.meshes.new("EZBake_tune_temp")
+        bm = bmesh.new()
+        bmesh.ops.create_uvsphere(bm, u_segments=128, v_segments=64, radius=1.0, calc_uvs=True)
+        bm.to_mesh(mesh)
+        bm.free()
+
+        obj = bpy.data.objects.new("EZBake_tune_temp", mesh)
+        context.scene.collection.objects.link(obj)
+        for o in context.selected_objects:
+            o.select_set(False)
+        obj.select_set(True)
+        context.view_layer.objects.active = obj
+
+        image = bpy.data.images.new("EZBake_tune_temp", width=512, height=512)
+        material = bpy.data.materials.new("EZBake_tune_temp")
+        material.use_nodes = True
+        nodes = material.node_tree.nodes
+        noise = nodes.new("ShaderNodeTexNoise")
+        material.node_tree.links.new(noise.outputs["Color"], nodes["Principled BSDF"].inputs["Base Color"])
+        image_node = nodes.new("ShaderNodeTexImage")
+        image_node.image = image
+        nodes.active = image_node
+        mesh.materials.append(material)
+
+        return obj, image
+
+
+def register():
+    bpy.utils.register_class(OBJECT_OT_ez_bake_autotune)
+
+
+def unregister():
+    bpy.utils.unregister_class(OBJECT_OT_ez_bake_autotune)
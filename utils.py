@@ -1,5 +1,61 @@
+import math
+import time
+
 import bpy
+import bmesh
+from bpy.app.handlers import persistent
 import mathutils
+import numpy as np
+from . import uv_islands
+from . import scratch
+from . import precision
+from . import profiling
+from . import texcore
+from . import report
+
+# Map name, bake type, non color
+# Order matters, packing relies on Color before Alpha and AO upsampling on Normal before AO
+MAPS = [
+    ("Color", "DIFFUSE", False),
+    ("Roughness", "ROUGHNESS", True),
+    ("Metallic", "EMIT", True),
+    ("Normal", "NORMAL", True),
+    ("AO", "AO", True),
+    ("Emission", "EMIT", False),
+    ("Alpha", "EMIT", True),
+]
+
+# Resolutions automatic resolution picks from, and the one used when an object has no UV area
+AUTO_RESOLUTIONS = [128, 256, 512, 1024, 2048, 4096, 8192]
+AUTO_FALLBACK_RESOLUTION = 2048
+
+# Maps packed into the ORM image
+ORM_MAPS = ["AO", "Roughness", "Metallic"]
+# Smallest resolution a reduced resolution AO bake goes down to
+AO_MIN_RESOLUTION = 64
+
+REGION_DUMMY_IMAGE = "EZBake_region_dummy"
+# Joined copy of an overlay layer's objects, baked selected to active onto the object
+OVERLAY_OBJECT = "EZBake_overlay_temp"
+
+# UDIM tile numbering, tile = 1001 + u + 10 * v with 10 tiles per row
+UDIM_FIRST_TILE = 1001
+UDIM_COLUMNS = 10
+# Copy of the bake UV map moved so the tile being baked lies in the 0-1 range
+TILE_UV_MAP = "EZBake_tile_uv"
+
+# Texels the UV islands are extended by after baking
+BAKE_MARGIN = 16
+
+# Object settings a collection preset doesn't set
+PRESET_IGNORED_PROPERTIES = {"rna_type", "name", "baked_as", "use_overlays", "overlay_layers", "active_layer_index"}
+
+# UV island masks and dilation indices of the current run
+_uv_cache = {}
+# World and UV surface areas for automatic resolution
+_area_cache = {}
+# Objects the area cache holds at most, the oldest entry is dropped first
+AREA_CACHE_SIZE = 64
 
 
 class OBJECT_OT_ez_bake_overlay_setup(bpy.types.Operator):
@@ -9,24 +65,40 @@ class OBJECT_OT_ez_bake_overlay_setup(bpy.types.Operator):
 
     layer_index: bpy.props.IntProperty()
 
+    # Joined through the data API, selection and the original objects stay untouched
+    @profiling.profile_execute
     def execute(self, context):
-        original_object = context.object
-        bpy.ops.object.select_all(action='DESELECT')
-
-        # Join copies of all contributing objects
-        for obj in context.object.ez_bake_object_props.overlay_layers[self.layer_index].objects:
-            obj.object.select_set(True)
-            context.view_layer.objects.active = obj.object
-
-        bpy.ops.object.duplicate() # Duplicate to not alter original objects
-        bpy.ops.object.convert(target='MESH') # Apply any modifiers
-        bpy.ops.object.join()
-        context.object.name = "EZBake_overlay_temp"
-
-        bpy.ops.object.select_all(action='DESELECT')
-
-        original_object.select_set(True)
-        context.view_layer.objects.active = original_object
+        depsgraph = context.evaluated_depsgraph_get()
+        remove_overlay_object()
+
+        # Evaluated copies of all contributing objects (modifiers applied), in world space
+        bm = bmesh.new()
+        materials = []
+        for item in context.object.ez_bake_object_props.overlay_layers[self.layer_index].objects:
+            obj = item.object
+            if obj is None:
+                continue
+            mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True,
+                                                   depsgraph=depsgraph)
+            mesh.transform(obj.matrix_world)
+
+            # Faces keep their materials, indices move past the ones of the objects before
+            offset = len(materials)
+            first_face = len(bm.faces)
+            bm.from_mesh(mesh)
+            bm.faces.ensure_lookup_table()
+            for face in bm.faces[first_face:]:
+                face.material_index += offset
+            materials += [slot.material for slot in obj.material_slots]
+            bpy.data.meshes.remove(mesh)
+
+        mesh = bpy.data.meshes.new(OVERLAY_OBJECT)
+        bm.to_mesh(mesh)
+        bm.free()
+        for material in materials:
+            mesh.materials.append(material)
+
+        context.scene.collection.objects.link(bpy.data.objects.new(OVERLAY_OBJECT, mesh))
         return {'FINISHED'}
 
 
@@ -36,29 +108,47 @@ class OBJECT_OT_ez_bake_overlay_cleanup(bpy.types.Operator):
     bl_options = {"INTERNAL"}
     bl_label = "Cleanup after baking an overlay layer"
 
+    @profiling.profile_execute
     def execute(self, context):
-        original_object = context.object
-
-        merged_object = context.scene.objects["EZBake_overlay_temp"]
+        remove_overlay_object()
+        return {'FINISHED'}
 
-        # Delete merged object
-        bpy.ops.object.select_all(action='DESELECT')
-        merged_object.select_set(True)
-        context.view_layer.objects.active = merged_object
-        bpy.ops.object.delete(use_global=False)
 
-        # Select original object
-        original_object.select_set(True)
-        context.view_layer.objects.active = original_object
-        return {'FINISHED'}
+def remove_overlay_object():
+    obj = bpy.data.objects.get(OVERLAY_OBJECT)
+    if obj is not None:
+        mesh = obj.data
+        bpy.data.objects.remove(obj)
+        if mesh is not None and mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
 
 
 class EzBakeProgress(bpy.types.PropertyGroup):
     progress: bpy.props.IntProperty(default=0)
     total: bpy.props.IntProperty(default=0)
+    # Estimated seconds of all steps and of the finished ones
+    estimated_total: bpy.props.FloatProperty(default=0.0)
+    estimated_done: bpy.props.FloatProperty(default=0.0)
+    # Unix time in seconds (IntProperty, float properties are single precision)
+    start_time: bpy.props.IntProperty(default=0)
+
+    def start(self, total, estimated_total):
+        self.progress = 0
+        self.total = total
+        self.estimated_total = estimated_total
+        self.estimated_done = 0.0
+        self.start_time = int(time.time())
 
-    def increment(self):
+    def increment(self, estimate=0.0):
         self.progress += 1
+        self.estimated_done += estimate
+
+    # Remaining seconds, corrected by how far off the estimates were so far
+    def get_eta(self):
+        elapsed = time.time() - self.start_time
+        if self.estimated_done > 0:
+            return (self.estimated_total - self.estimated_done) * elapsed / self.estimated_done
+        return max(self.estimated_total - elapsed, 0.0)
 
     def get_progress_fac(self):
         if self.total == 0:
@@ -67,6 +157,8 @@ class EzBakeProgress(bpy.types.PropertyGroup):
             return self.progress / self.total
 
     def get_progress_string(self):
+        if self.estimated_total > 0:
+            return f'{self.progress} / {self.total} ({format_duration(self.get_eta())} left)'
         return f'{self.progress} / {self.total}'
 
     def is_finished(self):
@@ -75,6 +167,225 @@ class EzBakeProgress(bpy.types.PropertyGroup):
     def reset(self):
         self.progress = 0
         self.total = 0
+        self.estimated_total = 0.0
+        self.estimated_done = 0.0
+
+
+# Resolution the object is baked at, previews are capped to the scene's preview resolution
+def get_resolution(obj, is_preview=False):
+    obj_props = obj.ez_bake_object_props
+    if obj_props.resolution == 'AUTO':
+        resolution = get_auto_resolution(obj)
+    else:
+        resolution = int(obj_props.resolution)
+    if is_preview:
+        return min(resolution, bpy.context.scene.ez_bake_scene_props.preview_resolution)
+    return resolution
+
+
+# Smallest power of two resolution reaching the texel density from the preferences
+def get_auto_resolution(obj):
+    prefs = bpy.context.preferences.addons[__package__].preferences
+    world_area, uv_area = get_surface_areas(obj, obj.ez_bake_object_props.uv_map)
+    if world_area <= 0 or uv_area <= 0:
+        return AUTO_FALLBACK_RESOLUTION
+
+    # Texels per meter = resolution * sqrt(uv_area / world_area)
+    side = prefs.texel_density * math.sqrt(world_area / uv_area)
+    return next((r for r in AUTO_RESOLUTIONS if r >= side), AUTO_RESOLUTIONS[-1])
+
+
+# UDIM tiles used by the object's UV map, [0] (a single regular image) unless UDIM baking is on
+# A face belongs to the tile its UV center lies in, every tile gets its own images at the object's resolution
+# Faces left of, right of or below the UDIM range aren't baked, warn tells how many when planning the bake
+def get_tiles(obj, warn=False):
+    obj_props = obj.ez_bake_object_props
+    if not obj_props.use_udim:
+        return [0]
+
+    centers = np.floor(get_uv_triangles(obj, obj_props.uv_map).mean(axis=1)).astype(np.int64)
+    u, v = centers[:, 0], centers[:, 1]
+    valid = (u >= 0) & (u < UDIM_COLUMNS) & (v >= 0)
+    outside = len(valid) - int(np.count_nonzero(valid))
+    if warn and outside > 0:
+        print(f"[EZBake]: Warning, {outside} triangles of {obj.name} lie outside the UDIM tiles "
+              f"(u from 0 to {UDIM_COLUMNS}, v from 0) and are not baked")
+    tiles = sorted(set((UDIM_FIRST_TILE + u[valid] + UDIM_COLUMNS * v[valid]).tolist()))
+    return tiles or [UDIM_FIRST_TILE]
+
+
+# UV offset of the tile's lower left corner
+def get_tile_offset(tile):
+    v, u = divmod(tile - UDIM_FIRST_TILE, UDIM_COLUMNS)
+    return u, v
+
+
+# Appended to image, file and journal names of a tile, Blender's {name}.{tile} UDIM convention
+def get_tile_suffix(tile):
+    return f'.{tile}' if tile else ""
+
+
+# Bake UV map moved by the tile offset into TILE_UV_MAP, the baker only fills the 0-1 range
+# The materials keep sampling the original UV map
+def setup_tile_uv_map(obj, uv_map, tile):
+    mesh = obj.data
+    remove_tile_uv_map(mesh)
+    if mesh.uv_layers.get(uv_map) is None and mesh.uv_layers.active is None:
+        raise Exception(f"{obj.name} has no UV map to bake tile {tile} with")
+    if mesh.uv_layers.new(name=TILE_UV_MAP, do_init=False) is None:
+        raise Exception(f"No free UV map slot on {obj.name} to bake tile {tile} with")
+
+    # Adding a layer invalidates references to the others
+    source = mesh.uv_layers.get(uv_map) or mesh.uv_layers.active
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    source.data.foreach_get("uv", uvs)
+    uvs = uvs.reshape(-1, 2) - np.array(get_tile_offset(tile), dtype=np.float32)
+    mesh.uv_layers[TILE_UV_MAP].data.foreach_set("uv", uvs.ravel())
+
+
+def remove_tile_uv_map(mesh):
+    layer = mesh.uv_layers.get(TILE_UV_MAP)
+    if layer is not None:
+        mesh.uv_layers.remove(layer)
+
+
+# Leftovers of an interrupted tile bake
+def remove_tile_uv_maps():
+    for mesh in bpy.data.meshes:
+        remove_tile_uv_map(mesh)
+
+
+# Tiled image of the given name reading the {name}.{tile} images baked for each tile
+def setup_tiled_image(name, tiles):
+    tile_images = {tile: bpy.data.images.get(f'{name}{get_tile_suffix(tile)}') for tile in tiles}
+    tile_images = {tile: image for tile, image in tile_images.items() if image is not None and image.filepath}
+    if not tile_images:
+        return None
+
+    first_tile, first_image = next(iter(tile_images.items()))
+    image = bpy.data.images.get(name)
+    if image is None:
+        image = bpy.data.images.new(name, width=first_image.size[0], height=first_image.size[1], tiled=True)
+
+    image.source = 'TILED'
+    image.filepath = first_image.filepath.replace(get_tile_suffix(first_tile) + ".", ".<UDIM>.")
+    for tile in tile_images:
+        if not any(t.number == tile for t in image.tiles):
+            image.tiles.new(tile_number=tile)
+    image.colorspace_settings.name = first_image.colorspace_settings.name
+    image.reload()
+    return image
+
+
+# Resolution a map is baked at, AO is baked smaller and upsampled to the object's resolution afterwards
+def get_bake_resolution(obj, map_name, is_preview=False):
+    resolution = get_resolution(obj, is_preview)
+    if map_name == "AO":
+        return min(resolution, max(resolution // int(obj.ez_bake_object_props.ao_scale), AO_MIN_RESOLUTION))
+    return resolution
+
+
+def get_samples(obj, is_preview=False, map_name=None):
+    if is_preview:
+        return 1
+    if map_name == "AO":
+        return obj.ez_bake_object_props.ao_samples
+    return obj.ez_bake_object_props.samples
+
+
+# Collections marked for batch baking, the scene's own collection included
+def get_batch_collections(scene):
+    collections = [scene.collection] + list(bpy.data.collections)
+    return [c for c in collections if c.ez_bake_collection_props.use_batch]
+
+
+# {object: collection settings} of the mesh objects of the batch collections in the scene,
+# an object in several collections gets the settings of the first one
+def get_batch_items(context):
+    scene_objects = set(context.scene.objects)
+    items = {}
+    for collection in get_batch_collections(context.scene):
+        for obj in collection.all_objects:
+            if obj.type == 'MESH' and obj in scene_objects and obj not in items:
+                items[obj] = collection.ez_bake_collection_props
+    return items
+
+
+def get_batch_objects(context):
+    return list(get_batch_items(context))
+
+
+# Give the batch objects the presets of their collections for the duration of a run
+# Returns the settings they had before, for restore_presets
+def apply_presets(context):
+    snapshot = {}
+    for obj, collection_props in get_batch_items(context).items():
+        if not collection_props.use_preset:
+            continue
+        obj_props = obj.ez_bake_object_props
+        properties = get_preset_properties(obj_props)
+        snapshot[obj.name] = {identifier: getattr(obj_props, identifier) for identifier in properties}
+        for identifier in properties:
+            setattr(obj_props, identifier, getattr(collection_props.preset, identifier))
+    return snapshot
+
+
+def restore_presets(snapshot):
+    for name, values in snapshot.items():
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            continue
+        for identifier, value in values.items():
+            setattr(obj.ez_bake_object_props, identifier, value)
+
+
+def get_preset_properties(obj_props):
+    return [prop.identifier for prop in obj_props.bl_rna.properties
+            if prop.identifier not in PRESET_IGNORED_PROPERTIES and not prop.is_readonly]
+
+
+# Name the object's images were baked under, linked duplicates reuse the images of the first one
+def get_bake_name(obj):
+    return obj.ez_bake_object_props.baked_as or obj.name
+
+
+# Nodes whose output depends on the object instance rather than the mesh, e.g. world space position
+OBJECT_DEPENDENT_NODES = {
+    "ShaderNodeObjectInfo",
+    "ShaderNodeNewGeometry",
+    "ShaderNodeAmbientOcclusion",
+    "ShaderNodeWireframe",
+}
+
+
+def material_depends_on_object(material):
+    if material is None or material.node_tree is None:
+        return False
+    return node_tree_depends_on_object(material.node_tree)
+
+
+def node_tree_depends_on_object(node_tree):
+    for node in node_tree.nodes:
+        if node.bl_idname in OBJECT_DEPENDENT_NODES:
+            return True
+        if node.bl_idname == "ShaderNodeAttribute" and node.attribute_type in {'OBJECT', 'INSTANCER'}:
+            return True
+        if node.bl_idname == "ShaderNodeTexCoord" and \
+                any(node.outputs[name].is_linked for name in ("Window", "Reflection", "Camera")):
+            return True
+        if node.bl_idname == "ShaderNodeGroup" and node.node_tree is not None and \
+                node_tree_depends_on_object(node.node_tree):
+            return True
+    return False
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds}s'
+    if seconds < 3600:
+        return f'{seconds // 60}m {seconds % 60:02d}s'
+    return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
 
 
 def check_material(material):
@@ -241,136 +552,260 @@ def cleanup_image_node(material, map_name):
         nodes.remove(node)
 
 
-# Overlay decal over base object texture
-def overlay_images(image_A, image_B, image_mask):
-    width, height = image_A.size
+# UV triangles (N, 3, 2) of the evaluated object, as seen by the baker
+# materials limits them to the faces using one of the named materials, tile moves that tile to 0-1
+def get_uv_triangles(obj, uv_map, materials=None, tile=0):
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.to_mesh()
+    try:
+        uv_layer = mesh.uv_layers.get(uv_map) or mesh.uv_layers.active
+        if uv_layer is None:
+            return np.zeros((0, 3, 2), dtype=np.float32)
+
+        mesh.calc_loop_triangles()
+        loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("loops", loops)
+        uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        uv_layer.data.foreach_get("uv", uvs)
+        uv_tris = uvs.reshape(-1, 2)[loops].reshape(-1, 3, 2)
+
+        if materials is not None:
+            slots = [i for i, slot in enumerate(obj_eval.material_slots)
+                     if slot.material is not None and slot.material.name in materials]
+            material_indices = np.empty(len(mesh.loop_triangles), dtype=np.int32)
+            mesh.loop_triangles.foreach_get("material_index", material_indices)
+            uv_tris = uv_tris[np.isin(material_indices, slots)]
+
+        if tile:
+            uv_tris = uv_tris - np.array(get_tile_offset(tile), dtype=np.float32)
+
+        return uv_tris
+    finally:
+        obj_eval.to_mesh_clear()
+
+
+# World space surface area and UV area of the evaluated object, the panel asks for it on every redraw
+# Cached until a depsgraph update changes the object's transform or evaluated geometry
+def get_surface_areas(obj, uv_map):
+    key = (obj.name, uv_map)
+    if key in _area_cache:
+        return _area_cache[key]
+
+    world_area, uv_area = 0.0, 0.0
+    obj_eval = obj.evaluated_get(bpy.context.evaluated_depsgraph_get())
+    # Only meshes have UVs, other types fall back to the default resolution
+    mesh = obj_eval.to_mesh() if obj.type == 'MESH' else None
+    if mesh is not None:
+        try:
+            uv_layer = mesh.uv_layers.get(uv_map) or mesh.uv_layers.active
+            if uv_layer is not None:
+                world_area, uv_area = get_mesh_areas(mesh, uv_layer, obj_eval.matrix_world)
+        finally:
+            obj_eval.to_mesh_clear()
+
+    if len(_area_cache) >= AREA_CACHE_SIZE:
+        del _area_cache[next(iter(_area_cache))]
+    _area_cache[key] = (float(world_area), float(uv_area))
+    return _area_cache[key]
+
+
+def get_mesh_areas(mesh, uv_layer, matrix_world):
+    mesh.calc_loop_triangles()
+    loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    vertices = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", vertices)
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uvs)
+
+    matrix = np.array(matrix_world, dtype=np.float64)
+    coords = coords.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    tris = coords[vertices].reshape(-1, 3, 3)
+    world_area = 0.5 * np.linalg.norm(np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0]), axis=1).sum()
+
+    uv_tris = uvs.reshape(-1, 2)[loops].reshape(-1, 3, 2).astype(np.float64)
+    edge_1 = uv_tris[:, 1] - uv_tris[:, 0]
+    edge_2 = uv_tris[:, 2] - uv_tris[:, 0]
+    uv_area = 0.5 * np.abs(edge_1[:, 0] * edge_2[:, 1] - edge_1[:, 1] * edge_2[:, 0]).sum()
+    return world_area, uv_area
+
+
+def clear_area_cache():
+    _area_cache.clear()
+
+
+# Drops the areas of objects whose transform or evaluated geometry (modifiers, edits, UVs) changed
+@persistent
+def update_area_cache(scene, depsgraph):
+    if not _area_cache:
+        return
+    names = {update.id.original.name for update in depsgraph.updates
+             if isinstance(update.id, bpy.types.Object) and (update.is_updated_geometry or update.is_updated_transform)}
+    for key in [key for key in _area_cache if key[0] in names]:
+        del _area_cache[key]
 
-    pixels_A = list(image_A.pixels[:])
-    pixels_B = list(image_B.pixels[:])
-    pixels_mask = list(image_mask.pixels[:])
-    result_pixels = [0.0] * len(pixels_A)
 
-    for y in range(height):
-        for x in range(width):
-            # Calculate the pixel index (4 values per pixel: R, G, B, A)
-            idx = (y * width + x) * 4
+@persistent
+def clear_area_cache_on_load(_):
+    _area_cache.clear()
 
-            # Get pixel data from Image A and Image B
-            r_A, g_A, b_A, alpha_A = pixels_A[idx:idx+4]
-            r_B, g_B, b_B, alpha_B = pixels_B[idx:idx+4]
-            r_mask, g_mask, b_mask, alpha_mask = pixels_mask[idx:idx+4]
 
-            def lerp(a, b, t):
-                return a + t * (b - a)
+# Boolean (height, width) mask of texels covered by the object's UV islands
+# (only of the faces using one of the given materials, only of the given UDIM tile)
+# Computed once per object, UV map, tile and resolution during a run
+def get_uv_island_mask(obj, uv_map, width, height, materials=None, tile=0):
+    key = ("mask", obj.name, uv_map, width, height, tuple(sorted(materials)) if materials is not None else None, tile)
+    report.count_cache("uv_masks", key in _uv_cache)
+    if key not in _uv_cache:
+        _uv_cache[key] = uv_islands.rasterize_triangles(get_uv_triangles(obj, uv_map, materials, tile), width, height)
+    return _uv_cache[key]
 
-            is_alpha = image_B == image_mask
-            if is_alpha:
-                r_out = max(r_A, r_B)
-                g_out = max(g_A, g_B)
-                b_out = max(b_A, b_B)
 
-                # r_out = r_A*r_B
-                # g_out = g_A*g_B
-                # b_out = b_A*b_B
-            else:
-                r_out = lerp(r_A, r_B, r_mask)
-                g_out = lerp(g_A, g_B, r_mask)
-                b_out = lerp(b_A, b_B, r_mask)
+def get_dilation_indices(obj, uv_map, width, height, tile=0):
+    key = ("dilation", obj.name, uv_map, width, height, tile)
+    report.count_cache("uv_dilation", key in _uv_cache)
+    if key not in _uv_cache:
+        mask = get_uv_island_mask(obj, uv_map, width, height, tile=tile)
+        _uv_cache[key] = uv_islands.get_dilation_indices(mask, BAKE_MARGIN)
+    return _uv_cache[key]
 
-            result_pixels[idx:idx+4] = [r_out, g_out, b_out, max(alpha_A, r_mask)]
-            # result_pixels[idx:idx+4] = [r_out, g_out, b_out, alpha_A * alpha_mask] # add option in the future
 
-    image_A.pixels = result_pixels
+def clear_uv_cache():
+    _uv_cache.clear()
 
 
-# pack alpha (image_B) into image a (color)
-def pack_alpha(image_A, image_B):
-    width, height = image_A.size
+# Image the materials outside a region re-bake bake into, so they leave the target alone
+def get_region_dummy_image():
+    image = bpy.data.images.get(REGION_DUMMY_IMAGE)
+    if image is None:
+        image = bpy.data.images.new(REGION_DUMMY_IMAGE, width=1, height=1)
+    return image
+
 
-    pixels_A = list(image_A.pixels[:])
-    pixels_B = list(image_B.pixels[:])
-    result_pixels = [0.0] * len(pixels_A)
+def remove_region_dummy_image():
+    image = bpy.data.images.get(REGION_DUMMY_IMAGE)
+    if image is not None:
+        bpy.data.images.remove(image)
 
-    for y in range(height):
-        for x in range(width):
-            # Calculate the pixel index (4 values per pixel: R, G, B, A)
-            idx = (y * width + x) * 4
 
-            # Get pixel data from Image A and Image B
-            r_A, g_A, b_A, alpha_A = pixels_A[idx:idx+4]
-            r_B, g_B, b_B, alpha_B = pixels_B[idx:idx+4]
+# Put the previous pixels back everywhere outside the (height, width) mask of re-baked texels
+def merge_region(image, previous_image, mask, map_name):
+    dtype = precision.get_dtype(map_name)
+    pixels = texcore.merge(read_pixels(previous_image, dtype), read_pixels(image, dtype), mask)
+    write_pixels(image, pixels)
+
+
+# (resolution, resolution, 4) pixels of a bake made at reduced resolution, upsampled along the edges
+# of the guide image (the normal bake of the same surface) when it has the full resolution
+def upsample_pixels(obj, image, resolution, map_name, guide_image=None, tile=0):
+    low = read_pixels(image, precision.get_dtype(map_name))
+    low_mask = get_uv_island_mask(obj, obj.ez_bake_object_props.uv_map, *image.size, tile=tile)
+
+    guide = None
+    if guide_image is not None and tuple(guide_image.size) == (resolution, resolution):
+        guide = read_pixels(guide_image, precision.get_dtype("Normal"))
+    return texcore.upsample(low, resolution, resolution, guide, low_mask)
+
+
+# Extend the UV islands of a baked image into the margin around them
+# Bakes run without margin, this replaces Cycles' margin pass for every map with one shared index
+def dilate_image(obj, image, map_name, tile=0):
+    width, height = image.size
+    margin_texels, source_texels = get_dilation_indices(obj, obj.ez_bake_object_props.uv_map, width, height, tile)
+    if len(margin_texels) == 0:
+        return
+
+    pixels = read_pixels(image, precision.get_dtype(map_name)).reshape(-1, 4)
+    pixels[margin_texels] = pixels[source_texels]
+    write_pixels(image, pixels)
 
-            result_pixels[idx:idx+4] = [r_A, g_A, b_A, r_B]
 
-    image_A.pixels = result_pixels
-    # result_image.save()
+# (height, width, 4) pixels of an image in the given working precision
+# Short lived, read straight from the image, only buffers kept across steps go to scratch files
+def read_pixels(image, dtype=np.float32):
+    width, height = image.size
+    return scratch.read_into(image, np.empty((height, width, 4), dtype=dtype))
 
 
+def write_pixels(image, pixels):
+    scratch.write_from(image, pixels)
+
+
+# Overlay decal over base object texture
+# overlay and mask are (height, width, 4) scratch buffers, the base is composited in its own pixel buffer
+def overlay_images(image_A, overlay, mask, is_alpha=False):
+    base = read_pixels(image_A, overlay.dtype)
+    texcore.overlay(base, overlay, mask, is_alpha)
+    write_pixels(image_A, base)
+
+
+# pack alpha (image_B) into image a (color)
+def pack_alpha(image_A, image_B):
+    dtype = precision.get_dtype("Color")
+    write_pixels(image_A, texcore.pack_alpha(read_pixels(image_A, dtype), read_pixels(image_B, dtype)))
+
+
+# Inputs restored from a previous run can be larger than the ones baked by a preview pass,
+# the ORM image gets the smallest resolution and larger inputs are box filtered down to it
 def combine_orm(ao_image, roughness_image, metallic_image, orm_name):
-    # image_name = f'{obj.name}_{self.map_name}'
-    resolution = 0
-    if ao_image is not None:
-        resolution = ao_image.size[0]
-    elif roughness_image is not None:
-        resolution = roughness_image.size[0]
-    elif metallic_image is not None:
-        resolution = metallic_image.size[0]
-
-    if ao_image is None:
-        ao_image = bpy.data.images.new(
-            "EZBake_orm_ao_temp", width=resolution, height=resolution)
-        ao_image.pixels = [1.0, 1.0, 1.0, 1.0] * (resolution * resolution)
-    if roughness_image is None:
-        roughness_image = bpy.data.images.new(
-            "EZBake_orm_roughness_temp", width=resolution, height=resolution)
-        roughness_image.pixels = [0.5, 0.5, 0.5,
-                                  1.0] * (resolution * resolution)
-    if metallic_image is None:
-        metallic_image = bpy.data.images.new(
-            "EZBake_orm_metallic_temp", width=resolution, height=resolution)
-        metallic_image.pixels = [0.0, 0.0, 0.0,
-                                 1.0] * (resolution * resolution)
-
-    # if res changes
+    images = {"AO": ao_image, "Roughness": roughness_image, "Metallic": metallic_image}
+    images = {name: image for name, image in images.items() if image is not None}
+    resolution = min((image.size[0] for image in images.values()), default=0)
+
+    # if res changes, resized in place so the material nodes using it (e.g. set up by a preview) keep it
     orm_image = bpy.data.images.get(orm_name)
     if orm_image is not None and \
             (orm_image.size[0] != resolution
              or orm_image.size[1] != resolution):
-        bpy.data.images.remove(orm_image)
+        orm_image.scale(resolution, resolution)
 
     if orm_image is None:
         orm_image = bpy.data.images.new(
             orm_name, width=resolution, height=resolution)
         orm_image.colorspace_settings.name = 'Non-Color'
 
-    ao_pixels = list(ao_image.pixels)
-    roughness_pixels = list(roughness_image.pixels)
-    metallic_pixels = list(metallic_image.pixels)
+    # R channel for AO, G channel for Roughness, B channel for Metallic, opaque alpha
+    dtype = precision.get_dtype("ORM")
+    maps = {}
+    for name, image in images.items():
+        pixels = read_pixels(image, dtype)
+        if image.size[0] != resolution:
+            pixels = precision.encode(texcore.downsample(precision.decode(pixels), resolution, resolution), dtype)
+        maps[name] = pixels
+    orm_pixels = texcore.combine_orm(maps, (resolution, resolution), "ORM", dtype)
 
-    orm_pixels = [0] * len(ao_pixels)
+    write_pixels(orm_image, orm_pixels)
 
-    for i in range(0, len(ao_pixels), 4):
-        # R channel for AO, G channel for Roughness, B channel for Metallic
-        orm_pixels[i] = ao_pixels[i]            # Red channel (AO)
-        orm_pixels[i+1] = roughness_pixels[i+1]  # Green channel (Roughness)
-        orm_pixels[i+2] = metallic_pixels[i+2]  # Blue channel (Metallic)
-        # Alpha channel (optional, set to 1.0 for opaque)
-        orm_pixels[i+3] = 1.0
+    return orm_image
 
-    orm_image.pixels = orm_pixels
 
-    image_name = orm_name
+@profiling.section()
+def setup_materials(context, objects=None):
+    if objects is None:
+        objects = context.selected_objects
 
-    return orm_image
+    for obj in objects:
+        # Objects which shared a bake also share the material
+        bake_name = get_bake_name(obj)
 
+        # UDIM bakes are read through one tiled image per baked map, named like a regular one
+        obj_props = obj.ez_bake_object_props
+        if obj_props.use_udim:
+            tiles = get_tiles(obj)
+            map_names = [m[0] for m in MAPS if getattr(obj_props, f'bake_{m[0].lower()}')]
+            if context.scene.ez_bake_scene_props.pack_orm and any(m in map_names for m in ORM_MAPS):
+                map_names.append("ORM")
+            for map_name in map_names:
+                setup_tiled_image(f'{bake_name}_{map_name}', tiles)
 
-def setup_materials(context):
-    # Check if material already exists
-    for obj in context.selected_objects:
-        if bpy.data.materials.get(obj.name) is not None:
-            return
+        # Check if material already exists
+        if bpy.data.materials.get(bake_name) is not None:
+            continue
 
-        material = bpy.data.materials.new(name=obj.name)
+        material = bpy.data.materials.new(name=bake_name)
         material.use_nodes = True
 
         nodes = material.node_tree.nodes
@@ -401,21 +836,21 @@ def setup_materials(context):
 
         # --- COLOR ---
         add_image_texture(bpy.data.images.get(
-            f'{obj.name}_Color'), "Base Color", (-300, 200))
+            f'{bake_name}_Color'), "Base Color", (-300, 200))
         # --- ALPHA ---
         add_image_texture(bpy.data.images.get(
-            f'{obj.name}_Alpha'), "Alpha", (-300, -600))
+            f'{bake_name}_Alpha'), "Alpha", (-300, -600))
         # --- EMISSION ---
         add_image_texture(bpy.data.images.get(
-            f'{obj.name}_Emission'), "Emission Color", (-300, -800))
-        if bpy.data.images.get(f'{obj.name}_Emission') is not None:
+            f'{bake_name}_Emission'), "Emission Color", (-300, -800))
+        if bpy.data.images.get(f'{bake_name}_Emission') is not None:
             principled_bsdf.inputs["Emission Strength"].default_value = 1.0
 
 
         # --- ORM ---
-        if bpy.data.images.get(f'{obj.name}_ORM'):
+        if bpy.data.images.get(f'{bake_name}_ORM'):
             orm_node = nodes.new(type="ShaderNodeTexImage")
-            orm_node.image = bpy.data.images.get(f'{obj.name}_ORM')
+            orm_node.image = bpy.data.images.get(f'{bake_name}_ORM')
             orm_node.location = (-500, 0)
 
             # Create a Separate RGB node to split ORM channels
@@ -431,19 +866,19 @@ def setup_materials(context):
         else:
             # --- ROUGHNESS ---
             add_image_texture(bpy.data.images.get(
-                f'{obj.name}_Roughness'), "Roughness", (-300, 0))
+                f'{bake_name}_Roughness'), "Roughness", (-300, 0))
             # --- METALLIC ---
             add_image_texture(bpy.data.images.get(
-                f'{obj.name}_Metallic'), "Metallic", (-300, -200))
+                f'{bake_name}_Metallic'), "Metallic", (-300, -200))
 
         # --- NORMAL ---
-        if bpy.data.images.get(f'{obj.name}_Normal'):
+        if bpy.data.images.get(f'{bake_name}_Normal'):
             normal_map_node = nodes.new(type="ShaderNodeNormalMap")
             normal_map_node.location = (-200, -400)
 
             normal_texture_node = nodes.new(type="ShaderNodeTexImage")
             normal_texture_node.image = bpy.data.images.get(
-                f'{obj.name}_Normal')
+                f'{bake_name}_Normal')
             normal_texture_node.location = (-300, -400)
 
             links.new(normal_texture_node.outputs["Color"], normal_map_node.inputs["Color"])
@@ -457,6 +892,8 @@ def register():
     bpy.utils.register_class(OBJECT_OT_ez_bake_overlay_cleanup)
     bpy.types.Scene.ez_bake_progress = bpy.props.PointerProperty(
         type=EzBakeProgress)
+    bpy.app.handlers.depsgraph_update_post.append(update_area_cache)
+    bpy.app.handlers.load_post.append(clear_area_cache_on_load)
 
 
 def unregister():
@@ -464,3 +901,7 @@ def unregister():
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_overlay_setup)
     bpy.utils.unregister_class(OBJECT_OT_ez_bake_overlay_cleanup)
     del bpy.types.Scene.ez_bake_progress
+    if update_area_cache in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(update_area_cache)
+    if clear_area_cache_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_area_cache_on_load)
@@ -0,0 +1,126 @@
+import numpy as np
+
+# Pure NumPy helpers for working with UV islands in texel space.
+# Kept free of bpy so they can be used from worker processes.
+
+# Upper bound on candidate texels tested at once while rasterizing
+RASTER_CHUNK = 1 << 20
+# Larger bounding boxes are tested in blocks of this many texels per side, so one big triangle
+# doesn't need a candidate grid of its whole bounding box
+RASTER_BLOCK = 256
+
+
+# Rasterize UV triangles (N, 3, 2) into a boolean coverage mask of shape (height, width)
+# A texel is covered when its center lies inside a triangle, matching Cycles' bake coverage
+def rasterize_triangles(uv_tris, width, height, mask=None):
+    if mask is None:
+        mask = np.zeros((height, width), dtype=bool)
+    if len(uv_tris) == 0:
+        return mask
+
+    # Texel space where texel (x, y) has its center at (x, y)
+    tris = np.asarray(uv_tris, dtype=np.float64) * (width, height) - 0.5
+    a, b, c = tris[:, 0], tris[:, 1], tris[:, 2]
+
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    lo_x = np.clip(np.ceil(tris[:, :, 0].min(axis=1)), 0, width).astype(np.int64)
+    hi_x = np.clip(np.floor(tris[:, :, 0].max(axis=1)), -1, width - 1).astype(np.int64)
+    lo_y = np.clip(np.ceil(tris[:, :, 1].min(axis=1)), 0, height).astype(np.int64)
+    hi_y = np.clip(np.floor(tris[:, :, 1].max(axis=1)), -1, height - 1).astype(np.int64)
+
+    valid = (hi_x >= lo_x) & (hi_y >= lo_y) & (area != 0)
+    tri, lo_x, hi_x, lo_y, hi_y = split_boxes(np.nonzero(valid)[0], lo_x[valid], hi_x[valid], lo_y[valid],
+                                              hi_y[valid])
+    box_w = hi_x - lo_x + 1
+    box_h = hi_y - lo_y + 1
+
+    # Group boxes by power of two size so each group can be tested in one go
+    size_class = np.ceil(np.log2(np.maximum(np.maximum(box_w, box_h), 1))).astype(np.int64)
+
+    for cls in np.unique(size_class):
+        side = 1 << int(cls)
+        offset_y, offset_x = np.divmod(np.arange(side * side), side)
+        indices = np.nonzero(size_class == cls)[0]
+        step = max(1, RASTER_CHUNK // (side * side))
+
+        for start in range(0, len(indices), step):
+            idx = indices[start:start + step]
+            px = lo_x[idx, None] + offset_x[None, :]
+            py = lo_y[idx, None] + offset_y[None, :]
+            inside = (px <= hi_x[idx, None]) & (py <= hi_y[idx, None])
+
+            ta, tb, tc = a[tri[idx]], b[tri[idx]], c[tri[idx]]
+            w0 = _edge(tb, tc, px, py)
+            w1 = _edge(tc, ta, px, py)
+            w2 = _edge(ta, tb, px, py)
+            inside &= ((w0 >= 0) & (w1 >= 0) & (w2 >= 0)) | ((w0 <= 0) & (w1 <= 0) & (w2 <= 0))
+
+            mask[py[inside], px[inside]] = True
+
+    return mask
+
+
+# Bounding boxes (triangle index, lo_x, hi_x, lo_y, hi_y) with the ones larger than RASTER_BLOCK
+# split into blocks of at most RASTER_BLOCK texels per side
+def split_boxes(tri, lo_x, hi_x, lo_y, hi_y):
+    large = (hi_x - lo_x >= RASTER_BLOCK) | (hi_y - lo_y >= RASTER_BLOCK)
+    boxes = [np.stack([tri[~large], lo_x[~large], hi_x[~large], lo_y[~large], hi_y[~large]], axis=1)]
+
+    for i in np.nonzero(large)[0]:
+        block_x = np.arange(lo_x[i], hi_x[i] + 1, RASTER_BLOCK)
+        block_y = np.arange(lo_y[i], hi_y[i] + 1, RASTER_BLOCK)
+        block_y, block_x = [v.ravel() for v in np.meshgrid(block_y, block_x, indexing="ij")]
+        boxes.append(np.stack([np.full_like(block_x, tri[i]), block_x,
+                               np.minimum(block_x + RASTER_BLOCK - 1, hi_x[i]),
+                               block_y, np.minimum(block_y + RASTER_BLOCK - 1, hi_y[i])], axis=1))
+
+    boxes = np.concatenate(boxes).astype(np.int64)
+    return tuple(boxes.T)
+
+
+# Signed edge function of point(s) p relative to edge (p0 -> p1)
+def _edge(p0, p1, px, py):
+    return (p1[:, 0, None] - p0[:, 0, None]) * (py - p0[:, 1, None]) - \
+        (p1[:, 1, None] - p0[:, 1, None]) * (px - p0[:, 0, None])
+
+
+# Neighbours searched while growing islands, straight ones first so they win ties
+NEIGHBOURS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+# Margin texels around the islands of a (height, width) mask and the covered texel each one copies,
+# as flat texel indices. Islands grow one texel per step like Cycles' extend margin, only the texels
+# filled in the previous step are grown from so the cost follows the size of the margin band
+def get_dilation_indices(mask, margin):
+    height, width = mask.shape
+    covered = mask.ravel()
+    source = np.where(covered, np.arange(height * width, dtype=np.int32), np.int32(-1))
+
+    # Covered texels next to an uncovered one, the image border counts as covered
+    padded = np.pad(mask, 1, constant_values=True)
+    interior = np.ones_like(mask)
+    for dy, dx in NEIGHBOURS:
+        interior &= padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+    frontier = np.flatnonzero(covered & ~interior.ravel())
+
+    filled = []
+    for _ in range(margin):
+        if len(frontier) == 0:
+            break
+        y, x = np.divmod(frontier, width)
+        grown = []
+        for dy, dx in NEIGHBOURS:
+            ty, tx = y + dy, x + dx
+            inside = (ty >= 0) & (ty < height) & (tx >= 0) & (tx < width)
+            targets = ty[inside] * width + tx[inside]
+            origins = frontier[inside]
+            free = source[targets] < 0
+            targets = targets[free]
+            source[targets] = source[origins[free]]
+            grown.append(targets)
+        frontier = np.concatenate(grown)
+        filled.append(frontier)
+
+    margin_texels = np.sort(np.concatenate(filled)) if filled else np.empty(0, dtype=np.int64)
+    return margin_texels, source[margin_texels]